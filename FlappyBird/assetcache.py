@@ -0,0 +1,109 @@
+"""On-disk cache of things that are slow to prepare at startup.
+
+Resolving a system font on Linux asks fontconfig about every installed
+font, and the bird sprite is decoded from a large PNG before being scaled
+down to 50px. The results are tiny, so they are kept in the user's cache
+directory (``$FLAPPY_CACHE_DIR`` if set) and reused on the next start for
+as long as their sources are unchanged.
+
+The cache is only ever a shortcut: anything missing, stale or unreadable
+is rebuilt, and failing to write it (say, on a read-only kiosk image) is
+not an error.
+"""
+import hashlib
+import json
+import os
+import struct
+import sys
+
+import pygame
+
+CACHE_VERSION = 1  # bump when anything that gets cached is drawn differently
+MAGIC = b"FBAC"
+# magic, pixel format, width, height, key digest, then the raw pixels
+SURFACE_HEADER = struct.Struct("<4s4sHH16s")
+FONTS_FILE = "fonts.json"
+
+
+def default_dir():
+    override = os.environ.get("FLAPPY_CACHE_DIR")
+    if override:
+        return override
+    if sys.platform == "win32":
+        base = os.environ.get("LOCALAPPDATA") or os.path.expanduser("~")
+    else:
+        base = os.environ.get("XDG_CACHE_HOME") or os.path.join(os.path.expanduser("~"), ".cache")
+    return os.path.join(base, "flappybird")
+
+
+def make_key(*parts):
+    """Digest identifying what a cached entry was built from."""
+    return hashlib.md5(repr((CACHE_VERSION,) + parts).encode()).digest()
+
+
+def file_key(path, *parts):
+    """Key for something derived from the file at ``path``; changes when the file does."""
+    st = os.stat(path)
+    return make_key(os.path.basename(path), st.st_size, st.st_mtime_ns, *parts)
+
+
+class AssetCache:
+    def __init__(self, directory=None):
+        self.directory = directory or default_dir()
+        self.fonts = None  # "name:bold" -> [font path or None, synthetic bold]
+
+    def path(self, name):
+        return os.path.join(self.directory, name)
+
+    # --- Surfaces ---
+    def load_surface(self, name, key):
+        """Return the cached surface stored under ``key``, or None."""
+        try:
+            with open(self.path(name), "rb") as f:
+                data = f.read()
+            magic, fmt, w, h, digest = SURFACE_HEADER.unpack_from(data)
+            if magic != MAGIC or digest != key:
+                return None
+            return pygame.image.frombytes(data[SURFACE_HEADER.size:], (w, h), fmt.rstrip(b"\0").decode())
+        except (OSError, struct.error, ValueError, pygame.error):
+            return None
+
+    def save_surface(self, name, key, surface, fmt="RGBA"):
+        w, h = surface.get_size()
+        header = SURFACE_HEADER.pack(MAGIC, fmt.encode(), w, h, key)
+        self.write(name, header + pygame.image.tobytes(surface, fmt))
+
+    def write(self, name, data):
+        """Replace a cache file atomically; give up quietly if the cache is not writable."""
+        path = self.path(name)
+        try:
+            os.makedirs(self.directory, exist_ok=True)
+            with open(path + ".tmp", "wb") as f:
+                f.write(data)
+            os.replace(path + ".tmp", path)
+        except OSError:
+            pass
+
+    # --- Fonts ---
+    def sysfont(self, name, size, bold=False):
+        """``pygame.font.SysFont``, minus the font lookup once it has been done before."""
+        if self.fonts is None:
+            try:
+                with open(self.path(FONTS_FILE)) as f:
+                    self.fonts = json.load(f)
+            except (OSError, ValueError):
+                self.fonts = {}
+        key = f"{name}:{int(bold)}"
+        entry = self.fonts.get(key)
+        if entry is None or (entry[0] is not None and not os.path.exists(entry[0])):
+            # Let SysFont do the lookup, but keep what it found instead of a font
+            found = []
+            pygame.font.SysFont(name, size, bold,
+                                constructor=lambda path, size, bold, italic: found.append([path, bold]))
+            entry = self.fonts[key] = found[0]
+            self.write(FONTS_FILE, json.dumps(self.fonts).encode())
+        path, synthetic_bold = entry
+        font = pygame.font.Font(path, size)
+        if synthetic_bold:
+            font.set_bold(True)
+        return font
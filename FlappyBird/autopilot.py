@@ -0,0 +1,221 @@
+"""Lookahead autopilot that plans flaps within a per-frame time budget.
+
+Between flaps the bird's path is fixed (``collision.Path``), so a plan is
+just the frames on which to flap, and each stretch between two flaps can be
+checked against every pipe, the floor and the ceiling in one call instead
+of frame by frame. ``Autopilot.decide`` searches depth first for a plan
+that stays clear until ``horizon`` frames ahead:
+
+* From each point it works out when the bird would hit something without
+  another flap. Hitting something from below is final, as flapping only
+  ever lifts the path; otherwise the branches are flapping on that frame
+  or earlier, latest first, down to the latest flap from which flapping
+  every frame still clears the contact and the pipes beyond it.
+* The flaps of the previous frame's plan are tried before anything else,
+  so while the plan still holds, re-checking it is the whole search.
+* Points that cannot reach the horizon are remembered. New pipes only ever
+  add obstacles, so a point stays hopeless for the rest of the run.
+* Once ``budget`` seconds are used up the search stops, and the bird keeps
+  the last plan unless the cut-short search got further.
+
+Only pipes already spawned are planned around, the way a player sees them.
+A new pipe comes into view about a second before the bird reaches it, which
+on HARD is not always enough to get from a high gap to a low one; those
+crashes say something about the difficulty, not the planner.
+``decide`` keeps the planning time and nodes expanded of recent frames:
+
+    python autopilot.py --difficulty HARD --seeds 0:20
+"""
+import argparse
+import itertools
+import sys
+import time
+from collections import deque
+
+from collision import Path, overlap
+from simulation import DIFFICULTY, FLOOR_Y, FPS, World
+from stats import percentile
+
+HORIZON = 60  # frames a plan has to stay clear for
+BUDGET = 0.0008  # seconds of planning per frame
+MARGIN = 0.5  # px a plan keeps from every edge, so nearly equal points share a fate
+STATS_FRAMES = FPS * 10  # frames kept for the planning figures
+
+
+class _OutOfTime(Exception):
+    pass
+
+
+class Autopilot:
+    def __init__(self, horizon=HORIZON, budget=BUDGET):
+        self.horizon = horizon
+        self.budget = budget
+        self.world = None
+        self.frame = 0  # world.frame at the last decision
+        self.plan = set()  # absolute steps to flap on
+        self.reach = 0  # last step the plan is known to be clear until
+        self.dead = {}  # step -> {(y, velocity)} after which no plan reaches the horizon
+        self.times = deque(maxlen=STATS_FRAMES)  # planning seconds per frame
+        self.nodes = deque(maxlen=STATS_FRAMES)  # points expanded per frame
+        self.overruns = 0  # frames whose search ran out of budget
+
+    def decide(self, world):
+        """Return True if the bird should flap on ``world``'s next step."""
+        started = time.perf_counter()
+        if world is not self.world or world.frame < self.frame:
+            self.world = world
+            self.plan = set()
+            self.reach = 0
+            self.dead.clear()
+        for step in [step for step in self.dead if step < world.frame]:
+            del self.dead[step]
+        self.frame = now = world.frame
+        bird = world.bird
+        self._bird = bird
+        # Frames each pipe overlaps the hitbox, and the band y has to stay in meanwhile
+        left, top, right, bottom = bird.hitbox()
+        top -= bird.center_y
+        bottom -= bird.center_y
+        self._gaps = [overlap(pipe.x, pipe.speed, left, right, pipe.width)
+                      + (pipe.height - top + MARGIN, pipe.height + pipe.gap - bottom + 1 - MARGIN)
+                      for pipe in world.pipes]
+        self._climbs = [(k0, high) for k0, _, _, high in self._gaps if k0 <= self.horizon]
+        self._deadline = started + self.budget
+        self._expanded = 0
+        self._hint = self.plan
+        self._best = (0, [])
+        flaps = []
+        try:
+            if self._search(0, bird.y, bird.velocity, 1, flaps):
+                self._best = (self.horizon, flaps)
+        except _OutOfTime:
+            self.overruns += 1
+        # A search cut short may not even have got as far as the last plan
+        reach, flaps = self._best
+        if now + reach >= self.reach:
+            self.plan = {now + step for step in flaps}
+            self.reach = now + reach
+        self.times.append(time.perf_counter() - started)
+        self.nodes.append(self._expanded)
+        return now + 1 in self.plan
+
+    def _contact(self, path, first):
+        """First frame from ``first`` on which ``path`` comes too close to anything.
+
+        Returns ``(frame, limit)``: ``limit`` is the height the bird has to
+        get above by that frame, or None if it is too high there instead.
+        """
+        last = self.horizon
+        hit = path.first_below(MARGIN, first, last)
+        limit = None
+        if hit is not None:
+            last = hit
+        floor = path.first_at_or_above(FLOOR_Y - MARGIN, first, last)
+        if floor is not None:
+            hit = last = floor
+            limit = FLOOR_Y - MARGIN
+        for k0, k1, low, high in self._gaps:
+            k0 = max(k0, first)
+            k1 = min(k1, last)
+            if k0 > k1:
+                continue
+            k = path.first_below(low, k0, k1)
+            if k is not None:
+                hit = last = k1 = k
+                limit = None
+            k = path.first_at_or_above(high, k0, k1)
+            if k is not None:
+                hit = last = k
+                limit = high
+        return hit, limit
+
+    def _search(self, origin, y, velocity, earliest, flaps):
+        """Extend ``flaps`` (steps from now) so the bird, at ``y`` and ``velocity`` after
+        step ``origin``, stays clear to the horizon flapping no earlier than ``earliest``."""
+        self._expanded += 1
+        if time.perf_counter() > self._deadline:
+            raise _OutOfTime
+        key = (round(y, 3), round(velocity, 3))
+        dead = self.dead.setdefault(self.frame + origin, set())
+        if key in dead:
+            return False
+        bird = self._bird
+        path = Path(y, velocity, bird.gravity, origin)
+        contact, limit = self._contact(path, origin + 1)
+        if contact is None:
+            return True
+        if contact > self._best[0]:
+            self._best = (contact, list(flaps))
+
+        # A flap only ever lifts the rest of the path, so it cannot get the bird
+        # lower, and flapping on every step from s on is the highest it can be.
+        # Flapping later never gets it any higher than that, so the flaps worth
+        # trying run from the latest that still clears the contact and every
+        # pipe further ahead back to ``earliest``.
+        if limit is not None:
+            rise = bird.flap_strength + bird.gravity
+            climbs = [(contact, limit)] + [(k, high) for k, high in self._climbs if k > contact]
+            latest = earliest - 1
+            lo, hi = earliest, contact
+            while lo <= hi:
+                step = (lo + hi) // 2
+                start = path.y(step - 1)
+                if all(start + (k - step + 1) * rise < high for k, high in climbs):
+                    lo = step + 1
+                    latest = step
+                else:
+                    hi = step - 1
+            hinted = [step - self.frame for step in self._hint if earliest <= step - self.frame <= latest]
+            hinted.sort(reverse=True)
+            later = (s for s in range(latest, earliest - 1, -1) if s not in hinted)
+            for step in itertools.chain(hinted, later):
+                # Flapping on step s restarts the path from where step s - 1 left the bird
+                flaps.append(step)
+                if self._search(step - 1, path.y(step - 1), bird.flap_strength, step + 1, flaps):
+                    return True
+                flaps.pop()
+        dead.add(key)
+        return False
+
+    def summary(self):
+        """Return ``(p50_ms, p99_ms, max_ms, p50_nodes, max_nodes)`` over recent frames."""
+        times = sorted(self.times)
+        nodes = sorted(self.nodes)
+        if not times:
+            return 0.0, 0.0, 0.0, 0, 0
+        return (percentile(times, 0.5) * 1000, percentile(times, 0.99) * 1000, times[-1] * 1000,
+                percentile(nodes, 0.5), nodes[-1])
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Play seeded games with the autopilot and report how it did.")
+    parser.add_argument("--difficulty", choices=("EASY", "MEDIUM", "HARD"), default="HARD")
+    parser.add_argument("--seeds", default="0:20", help="half-open seed range START:STOP (default 0:20)")
+    parser.add_argument("--max-frames", type=int, default=FPS * 120,
+                        help="stop a game after this many frames (default 2 minutes)")
+    parser.add_argument("--horizon", type=int, default=HORIZON, help="frames each plan must stay clear for")
+    parser.add_argument("--budget-ms", type=float, default=BUDGET * 1000, help="planning time per frame")
+    args = parser.parse_args(argv)
+    start, _, stop = args.seeds.partition(":")
+
+    pilot = Autopilot(args.horizon, args.budget_ms / 1000)
+    pilot.times = deque()  # Keep every frame for the report
+    pilot.nodes = deque()
+    crashed = 0
+    for seed in range(int(start), int(stop)):
+        world = World(DIFFICULTY[args.difficulty], seed)
+        done = False
+        while not done and world.frame < args.max_frames:
+            _, _, done = world.step(pilot.decide(world))
+        crashed += done
+        print(f"seed {seed}: score {world.score}" + (f", crashed on frame {world.frame - 1}" if done else ""))
+
+    p50_ms, p99_ms, max_ms, p50_nodes, max_nodes = pilot.summary()
+    print(f"{len(pilot.times)} frames planned: p50 {p50_ms:.3f} ms, p99 {p99_ms:.3f} ms, max {max_ms:.3f} ms; "
+          f"nodes p50 {p50_nodes}, max {max_nodes}; {pilot.overruns} frames ran out of budget; "
+          f"{crashed} of {int(stop) - int(start)} games crashed")
+    return 1 if crashed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
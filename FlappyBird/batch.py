@@ -0,0 +1,131 @@
+"""Many independent runs of the game advanced in lockstep with NumPy.
+
+``BatchWorld`` keeps every bird's position, velocity and alive flag in arrays
+and moves all of them with a handful of vectorised operations per frame.
+Runs in a batch share one set of difficulty settings, so pipes spawn and
+scroll on the same frames everywhere; only the pipe heights differ, each run
+drawing them from its own ``random.Random(seed)`` exactly as
+``simulation.World`` does. A game in the batch therefore plays out frame for
+frame like ``World(settings, seed)`` fed the same flaps, up to the frame it
+crashes. The falling animation after a crash is not simulated.
+"""
+import random
+
+import numpy as np
+
+from simulation import (BASE_HEIGHT, GROUND_HEIGHT, BIRD_START_X, BIRD_SIZE,
+                        MAX_FALL_SPEED, FLOOR_Y, FIRST_PIPE_X, PIPE_SPAWN_X,
+                        PIPE_SPACING, PIPE_MIN_HEIGHT, PIPE_DESPAWN_X, PIPE_WIDTH, PIPE_INSET,
+                        HITBOX_SHRINK_X, HITBOX_SHRINK_Y, MAX_PIPES)
+
+
+class BatchWorld:
+    """``len(seeds)`` runs of one difficulty, stepped together."""
+
+    def __init__(self, settings, seeds, bird_size=BIRD_SIZE):
+        self.settings = settings
+        self.bird_size = bird_size
+        self.reset(seeds)
+
+    def reset(self, seeds=None):
+        if seeds is not None:
+            self.seeds = list(seeds)
+        n = len(self.seeds)
+        self.rngs = [random.Random(seed) for seed in self.seeds]
+        self.y = np.full(n, float(BASE_HEIGHT // 2))
+        self.velocity = np.zeros(n)
+        self.center_y = np.full(n, BASE_HEIGHT // 2, dtype=np.int64)
+        self.alive = np.ones(n, dtype=bool)
+        self.score = np.zeros(n, dtype=np.int64)
+        self.death_frame = np.full(n, -1, dtype=np.int64)
+        self.frame = 0
+
+        # Pipe x positions are shared by every run; heights are per run.
+        self.pipe_x = []
+        self.pipe_slot = []
+        self.pipe_passed = []
+        self.pipe_height = np.zeros((n, MAX_PIPES), dtype=np.int64)
+        self._free_slots = list(range(MAX_PIPES - 1, -1, -1))
+        self._spawn(FIRST_PIPE_X)
+
+    def _spawn(self, x):
+        slot = self._free_slots.pop()
+        max_height = BASE_HEIGHT - GROUND_HEIGHT - self.settings["gap"] - 50
+        live = np.flatnonzero(self.alive).tolist()
+        rngs = self.rngs
+        self.pipe_height[live, slot] = [rngs[i].randint(PIPE_MIN_HEIGHT, max_height) for i in live]
+        self.pipe_x.append(x)
+        self.pipe_slot.append(slot)
+        self.pipe_passed.append(False)
+
+    def observe(self):
+        """Return ``(y, velocity, pipe_dx, pipe_height, gap)`` like ``World.observe``."""
+        left = BIRD_START_X - self.bird_size[0] // 2 + HITBOX_SHRINK_X // 2
+        for x, slot in zip(self.pipe_x, self.pipe_slot):
+            if x + PIPE_WIDTH - PIPE_INSET > left:
+                return (self.y, self.velocity, x - BIRD_START_X,
+                        self.pipe_height[:, slot], self.settings["gap"])
+        zero = np.zeros_like(self.center_y)
+        return (self.y, self.velocity, 0, zero, 0)
+
+    def step(self, actions=None):
+        """Advance every live run one frame.
+
+        ``actions`` is a boolean array of flaps (or ``None`` for no flaps).
+        Returns ``(rewards, done)``: pipes passed this frame per run, and
+        which runs have crashed so far.
+        """
+        alive = self.alive
+        settings = self.settings
+        rewards = np.zeros(alive.shape, dtype=np.int64)
+        if not alive.any():
+            return rewards, ~alive
+
+        velocity = self.velocity
+        if actions is not None:
+            np.copyto(velocity, settings["flap"], where=np.logical_and(actions, alive))
+        np.add(velocity, settings["gravity"], out=velocity, where=alive)
+        np.minimum(velocity, MAX_FALL_SPEED, out=velocity, where=alive)
+        y = self.y
+        np.add(y, velocity, out=y, where=alive)
+        center_y = self.center_y
+        np.copyto(center_y, y.astype(np.int64), where=alive)
+
+        if self.pipe_x[-1] < PIPE_SPAWN_X - PIPE_SPACING:
+            self._spawn(PIPE_SPAWN_X)
+
+        bird_w, bird_h = self.bird_size
+        left = BIRD_START_X - bird_w // 2 + HITBOX_SHRINK_X // 2
+        right = left + bird_w - HITBOX_SHRINK_X
+        top = center_y - (bird_h // 2 - HITBOX_SHRINK_Y // 2)
+        bottom = top + (bird_h - HITBOX_SHRINK_Y)
+
+        speed = settings["speed"]
+        gap = settings["gap"]
+        crashed = y >= FLOOR_Y
+        pipe_x = self.pipe_x
+        passed = self.pipe_passed
+        for i, slot in enumerate(self.pipe_slot):
+            x = pipe_x[i] - speed
+            pipe_x[i] = x
+            if left < x + PIPE_WIDTH - PIPE_INSET and right > x + PIPE_INSET:
+                height = self.pipe_height[:, slot]
+                crashed |= (top < height) & (bottom > 0)
+                crashed |= (bottom > height + gap) & (top < height + gap + BASE_HEIGHT)
+            if not passed[i] and x < BIRD_START_X:
+                passed[i] = True
+                rewards += 1
+
+        rewards *= alive
+        self.score += rewards
+        crashed &= alive
+        alive &= ~crashed
+        self.death_frame[crashed] = self.frame
+
+        np.maximum(y, 0, out=y)
+        if pipe_x[0] < PIPE_DESPAWN_X:
+            pipe_x.pop(0)
+            passed.pop(0)
+            self._free_slots.append(self.pipe_slot.pop(0))
+        self.frame += 1
+        return rewards, ~alive
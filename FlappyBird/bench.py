@@ -0,0 +1,407 @@
+"""Headless rendering benchmark.
+
+Runs the real game code under SDL's dummy video and audio drivers, drives a
+set of scripted scenarios through the same tick / draw / present sequence
+as ``flappy.main`` and reports frames per second and frame-time
+percentiles:
+
+    python bench.py --out bench.json
+    python bench.py --baseline bench.json --threshold 10
+    python bench.py --backend texture
+    python bench.py --quality 2
+    python bench.py --pipelined
+    python bench.py --allocations --alloc-budget 4096
+    python bench.py --levels
+
+With ``--baseline`` every scenario is compared against an earlier result
+file and the exit status is 1 if any of them got slower than the threshold
+allows, so the benchmark can gate a change.
+
+``--allocations`` traces Python allocations with ``tracemalloc`` instead of
+timing frames. Once the warmup has filled the caches, every frame should
+only need a little temporary memory and keep none of it; the exit status is
+1 if a scenario's worst frame peaks more than ``--alloc-budget`` bytes above
+where it started, or if memory grows by more than that over the whole run.
+The allocation sites behind any growth are printed.
+
+``--levels`` runs each scenario at every quality level the adaptive
+governor would use in its window, and reports the window pixels presented
+per frame next to the frame times. The exit status is 1 if a level that
+lowers the resolution does not present fewer pixels than the level before
+it; levels that change nothing in that window are listed as skipped.
+"""
+import argparse
+import gc
+import json
+import os
+import platform
+import sys
+import time
+import tracemalloc
+from array import array
+
+# Must be set before flappy.init() brings up the display and audio.
+os.environ.setdefault("SDL_VIDEODRIVER", "dummy")
+os.environ.setdefault("SDL_AUDIODRIVER", "dummy")
+
+import pygame
+
+import flappy
+from profiler import FrameProfiler
+from simulation import BASE_WIDTH, BASE_HEIGHT, DIFFICULTY, FPS
+from stats import percentile
+
+FULLSCREEN_SIZE = (1920, 1080)
+SEED = 1
+METRICS = ("mean_ms", "p50_ms", "p90_ms", "p99_ms")
+WARMUP = 120
+# Long enough for every pipe height in the sprite cache to have been replaced
+# at least once, so the caches are as full as they get
+ALLOC_WARMUP = 1200
+ALLOC_BUDGET = 4096  # default for --alloc-budget
+GROWTH_SITES = 5  # allocation sites listed for a scenario that grew
+
+
+# --- SCENARIOS ---
+# Each scenario is a generator: it sets the game up, then yields once per
+# frame after applying whatever input that frame should see.
+
+def hover_buttons(game, buttons):
+    """Sweep the mouse over each button in turn so their hover animations run."""
+    frame = 0
+    while True:
+        target = buttons[frame // 30 % len(buttons)]
+        game.mouse_pos = target.rect.center if frame % 30 < 20 else (0, 0)
+        frame += 1
+        yield
+
+
+def hold_in_gap(game):
+    """Keep the bird in the middle of the next gap so the run never ends."""
+    while True:
+        world = game.world
+        _, _, _, height, gap = world.observe()
+        if gap:
+            world.bird.y = height + gap // 2
+            world.bird.velocity = 0
+        yield
+
+
+def menu(game):
+    yield from hover_buttons(game, game.main_menu_btns)
+
+
+def playing_hard(game):
+    game.start_run("HARD", SEED)
+    yield from hold_in_gap(game)
+
+
+def custom_speed_15(game):
+    custom = DIFFICULTY["CUSTOM"]
+    saved = dict(custom)
+    custom["speed"] = 15
+    try:
+        game.start_run("CUSTOM", SEED)
+        yield from hold_in_gap(game)
+    finally:
+        custom.update(saved)
+
+
+def gameover(game):
+    game.start_run("HARD", SEED)
+    while game.state != "GAMEOVER":
+        game.tick()  # Nobody flaps, so the bird drops to the floor
+    yield from hover_buttons(game, game.game_over_btns)
+
+
+# name -> (window size, scenario)
+SCENARIOS = {
+    "menu": ((BASE_WIDTH, BASE_HEIGHT), menu),
+    "playing_hard": ((BASE_WIDTH, BASE_HEIGHT), playing_hard),
+    "custom_speed_15": ((BASE_WIDTH, BASE_HEIGHT), custom_speed_15),
+    "gameover": ((BASE_WIDTH, BASE_HEIGHT), gameover),
+    "playing_hard_fullscreen": (FULLSCREEN_SIZE, playing_hard),
+}
+
+
+def set_window(size):
+    """Open a window of ``size`` and rescale the presenter to it, as toggle_fullscreen does."""
+    flappy.SCREEN_WIDTH, flappy.SCREEN_HEIGHT = size
+    if flappy.window is not None:
+        flappy.window.size = size
+    else:
+        flappy.screen = pygame.display.set_mode(size)
+    flappy.presenter.reset()
+
+
+def play_frame(game, inputs, profiler, pipeline=None):
+    """One frame as flappy.main runs it; with a ``pipeline`` the tick overlaps presenting."""
+    profiler.begin_frame()
+    if pipeline:
+        pipeline.finish()
+    next(inputs)
+    pygame.event.pump()
+    if not pipeline:
+        game.tick()
+    profiler.lap("update")
+    game.draw(0.5)
+    if pipeline:
+        pipeline.start(1 / FPS)  # Exactly one tick a frame, whatever the wall clock says
+    flappy.presenter.present()
+    profiler.end_frame()
+
+
+def run_scenario(name, frames, warmup, pipelined=False):
+    size, scenario = SCENARIOS[name]
+    set_window(size)
+    game = flappy.Game()
+    inputs = scenario(game)
+    profiler = flappy.profiler = FrameProfiler(window=frames)
+    pipeline = flappy.SimulationThread(game, 1 / FPS) if pipelined else None
+    pixels = 0
+    try:
+        for frame in range(warmup + frames):
+            if frame == warmup:
+                profiler.frame_times.clear()
+                profiler.phases.clear()
+                pixels = 0
+            play_frame(game, inputs, profiler, pipeline)
+            pixels += flappy.presenter.pixels
+    finally:
+        if pipeline:
+            pipeline.close()
+        inputs.close()
+
+    times = sorted(profiler.frame_times)
+    total = sum(times)
+    return {
+        "window": list(size),
+        "frames": len(times),
+        "fps": len(times) / total if total else 0.0,
+        "mean_ms": total / len(times) * 1000,
+        "p50_ms": percentile(times, 0.5) * 1000,
+        "p90_ms": percentile(times, 0.9) * 1000,
+        "p99_ms": percentile(times, 0.99) * 1000,
+        "max_ms": times[-1] * 1000,
+        "pixels_per_frame": pixels / len(times),
+        "phases": {phase: p50 for phase, p50, _ in profiler.summary()[1:]},
+    }
+
+
+def trace_allocations(name, frames, warmup):
+    """Run a scenario under tracemalloc and report what its frames allocate.
+
+    ``peak`` figures are how far a frame's traced memory rose above where
+    it started, i.e. the temporary objects it needed at once; ``growth`` is
+    how much more memory is held after the measured frames than before.
+    """
+    size, scenario = SCENARIOS[name]
+    set_window(size)
+    game = flappy.Game()
+    inputs = scenario(game)
+    # A one-frame window keeps the profiler's own history from growing
+    profiler = flappy.profiler = FrameProfiler(window=1)
+    peaks = array("q", [0]) * frames  # Filled in place, so storing a figure allocates nothing
+    # Traced from the start, so that what the caches evict later is seen being freed
+    tracemalloc.start()
+    try:
+        for _ in range(warmup):
+            play_frame(game, inputs, profiler)
+        before = tracemalloc.take_snapshot()
+        collections = sum(stats["collections"] for stats in gc.get_stats())
+        start, _ = tracemalloc.get_traced_memory()
+        for frame in range(frames):
+            tracemalloc.reset_peak()
+            frame_start, _ = tracemalloc.get_traced_memory()
+            play_frame(game, inputs, profiler)
+            _, peak = tracemalloc.get_traced_memory()
+            peaks[frame] = peak - frame_start
+        end, _ = tracemalloc.get_traced_memory()
+        collections = sum(stats["collections"] for stats in gc.get_stats()) - collections
+        after = tracemalloc.take_snapshot()
+    finally:
+        tracemalloc.stop()
+        inputs.close()
+
+    ignore = [tracemalloc.Filter(False, tracemalloc.__file__), tracemalloc.Filter(False, __file__)]
+    growth_sites = [str(stat) for stat in after.filter_traces(ignore).compare_to(before.filter_traces(ignore), "lineno")
+                    if stat.size_diff > 0][:GROWTH_SITES]
+    peaks = sorted(peaks)
+    return {
+        "window": list(size),
+        "frames": frames,
+        "peak_p50_bytes": percentile(peaks, 0.5),
+        "peak_p99_bytes": percentile(peaks, 0.99),
+        "peak_max_bytes": peaks[-1],
+        "growth_bytes": end - start,
+        "gc_collections": collections,
+        "growth_sites": growth_sites,
+    }
+
+
+def over_budget(results, budget):
+    """Return the names of scenarios whose worst frame or total growth exceeds ``budget`` bytes."""
+    return [name for name, result in results.items()
+            if result["peak_max_bytes"] > budget or result["growth_bytes"] > budget]
+
+
+def compare(results, baseline, metric, threshold):
+    """Return the names of scenarios whose ``metric`` grew by more than ``threshold`` percent."""
+    regressions = []
+    for name, result in results.items():
+        before = baseline.get(name)
+        if before is None or not before.get(metric):
+            continue
+        change = (result[metric] - before[metric]) / before[metric] * 100
+        result["change_pct"] = change
+        if change > threshold:
+            regressions.append(name)
+    return regressions
+
+
+def write_results(args, results):
+    with open(args.out, "w") as f:
+        json.dump({"backend": "texture" if flappy.window else "surface", "quality": args.quality,
+                   "pipelined": args.pipelined,
+                   "python": platform.python_version(), "pygame": pygame.version.ver,
+                   "sdl": ".".join(map(str, pygame.get_sdl_version())),
+                   "platform": platform.platform(), "timestamp": time.time(),
+                   "frames": args.frames, "scenarios": results}, f, indent=2)
+
+
+def check_allocations(args):
+    results = {}
+    for name in args.scenario or SCENARIOS:
+        results[name] = trace_allocations(name, args.frames, args.warmup)
+    failed = over_budget(results, args.alloc_budget)
+
+    print(f"{'scenario':<24} {'window':>9} {'p50':>8} {'p99':>8} {'max':>8} {'growth':>8}  bytes  gc")
+    for name, r in results.items():
+        print(f"{name:<24} {'x'.join(map(str, r['window'])):>9} {r['peak_p50_bytes']:>8} "
+              f"{r['peak_p99_bytes']:>8} {r['peak_max_bytes']:>8} {r['growth_bytes']:>8}  "
+              f"{r['gc_collections']:>5}" + ("  OVER BUDGET" if name in failed else ""))
+        if name in failed:
+            for site in r["growth_sites"]:
+                print(f"    {site}")
+
+    if args.out:
+        write_results(args, results)
+
+    pygame.quit()
+    if failed:
+        print(f"allocations exceeded {args.alloc_budget} bytes in: {', '.join(failed)}")
+        return 1
+    return 0
+
+
+def check_levels(args):
+    """Measure each scenario at the quality levels the governor would use in its window."""
+    results = {}
+    failed = []
+    print(f"{'scenario':<24} {'window':>9} {'level':<22} {'fps':>8} {'p50':>7} {'p99':>7}  ms  {'px/frame':>9}")
+    for name in args.scenario or SCENARIOS:
+        set_window(SCENARIOS[name][0])
+        idle = flappy.idle_quality_levels()
+        window = "x".join(map(str, SCENARIOS[name][0]))
+        results[name] = {}
+        before = None
+        for level, settings in enumerate(flappy.QUALITY_LEVELS):
+            label = f"{level} {settings['name']}"
+            if level in idle:
+                print(f"{name:<24} {window:>9} {label:<22} skipped: same as level {before} here")
+                continue
+            flappy.set_quality(level)
+            r = results[name][level] = run_scenario(name, args.frames, args.warmup, args.pipelined)
+            shrunk = before is not None and settings["output_scale"] < flappy.QUALITY_LEVELS[before]["output_scale"]
+            wasted = shrunk and r["pixels_per_frame"] >= results[name][before]["pixels_per_frame"]
+            if wasted:
+                failed.append(f"{name} at level {level}")
+            print(f"{name:<24} {window:>9} {label:<22} {r['fps']:>8.1f} {r['p50_ms']:>7.3f} {r['p99_ms']:>7.3f}"
+                  f"      {r['pixels_per_frame']:>9.0f}" + ("  NO SAVING" if wasted else ""))
+            before = level
+
+    if args.out:
+        write_results(args, results)
+
+    pygame.quit()
+    if failed:
+        print(f"lower resolution presented no fewer pixels in: {', '.join(failed)}")
+        return 1
+    return 0
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--scenario", action="append", choices=list(SCENARIOS),
+                        help="scenario to run, may be repeated (default all)")
+    parser.add_argument("--backend", choices=("surface", "texture"), default="surface",
+                        help="renderer backend to measure, as in flappy.py")
+    parser.add_argument("--quality", type=int, choices=range(len(flappy.QUALITY_LEVELS)), default=0,
+                        help="fixed quality level to measure, as in flappy.py")
+    parser.add_argument("--pipelined", action="store_true",
+                        help="tick on a second thread while presenting, as flappy.py --pipelined")
+    parser.add_argument("--frames", type=int, default=600, help="measured frames per scenario")
+    parser.add_argument("--warmup", type=int,
+                        help="frames to run before measuring, to fill caches and the screen "
+                             f"(default {WARMUP}, or {ALLOC_WARMUP} with --allocations)")
+    parser.add_argument("--out", help="write the results as JSON")
+    parser.add_argument("--baseline", help="earlier --out file to compare against")
+    parser.add_argument("--metric", choices=METRICS, default="p50_ms",
+                        help="frame-time figure compared with the baseline")
+    parser.add_argument("--threshold", type=float, default=10.0,
+                        help="allowed slowdown against the baseline, in percent")
+    parser.add_argument("--allocations", action="store_true",
+                        help="trace allocations per frame instead of timing frames")
+    parser.add_argument("--levels", action="store_true",
+                        help="measure every quality level the governor would use, instead of --quality")
+    parser.add_argument("--alloc-budget", type=int, default=ALLOC_BUDGET,
+                        help="bytes a frame may peak above its start, and the run may grow, with --allocations")
+    args = parser.parse_args(argv)
+    if args.allocations and args.baseline:
+        parser.error("--baseline compares frame times, which --allocations does not measure")
+    if args.allocations and args.pipelined:
+        parser.error("--allocations traces the serial loop; the pipeline allocates a future every frame")
+    if args.levels and (args.allocations or args.baseline):
+        parser.error("--levels measures its own set of levels; run --allocations and --baseline on their own")
+    if args.warmup is None:
+        args.warmup = ALLOC_WARMUP if args.allocations else WARMUP
+
+    baseline = None
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)["scenarios"]
+
+    flappy.init(args.backend)
+    flappy.init_audio()
+    flappy.set_quality(args.quality)
+    if args.allocations:
+        return check_allocations(args)
+    if args.levels:
+        return check_levels(args)
+    results = {}
+    for name in args.scenario or SCENARIOS:
+        results[name] = run_scenario(name, args.frames, args.warmup, args.pipelined)
+
+    regressions = compare(results, baseline, args.metric, args.threshold) if baseline else []
+
+    print(f"{'scenario':<24} {'window':>9} {'fps':>8} {'p50':>7} {'p90':>7} {'p99':>7} {'max':>7}  ms"
+          + ("   change" if baseline else ""))
+    for name, r in results.items():
+        line = (f"{name:<24} {'x'.join(map(str, r['window'])):>9} {r['fps']:>8.1f} {r['p50_ms']:>7.3f} "
+                f"{r['p90_ms']:>7.3f} {r['p99_ms']:>7.3f} {r['max_ms']:>7.3f}")
+        if "change_pct" in r:
+            line += f"  {r['change_pct']:+7.1f}%" + ("  REGRESSED" if name in regressions else "")
+        print(line)
+
+    if args.out:
+        write_results(args, results)
+
+    pygame.quit()
+    if regressions:
+        print(f"{args.metric} regressed by more than {args.threshold}% in: {', '.join(regressions)}")
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
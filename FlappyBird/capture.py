@@ -0,0 +1,200 @@
+"""Recording gameplay to PNG sequences, raw video or Y4M without stalling the game.
+
+``FrameCapture.add`` copies a frame's pixels into a free slot of a ring of
+preallocated buffers in shared memory, hands the slot to a worker process
+and returns; the copy is the only cost the game loop pays. Encoding and
+writing happen in the workers, so they never hold the game's GIL. If every
+slot is still waiting for a worker, the frame is dropped and counted instead
+of making the game wait.
+
+The output format follows the path:
+
+* ``*.y4m``: YUV 4:2:0 video (BT.601, limited range) that players and
+  ffmpeg read directly.
+* ``*.raw``: the pixels as the surface stores them, one frame after
+  another, e.g. ``ffmpeg -f rawvideo -pix_fmt bgr0 -s 400x600 -r 60 -i capture.raw``
+  (the ``pix_fmt`` to use is in ``FrameCapture.pix_fmt``).
+* anything else: a directory of numbered PNG files. One PNG takes longer
+  to encode than a frame lasts, so several workers encode them at once.
+"""
+import multiprocessing
+import os
+import queue
+import time
+from multiprocessing.shared_memory import SharedMemory
+
+import numpy as np
+
+CAPTURE_SLOTS = 16  # frames that can be waiting for a worker before frames are dropped
+MAX_PNG_WORKERS = 4
+READY = -1  # sent by a worker once it is waiting for frames
+STARTUP_TIMEOUT = 30  # seconds to wait for the workers to start
+# RGB to Y, U, V for BT.601 limited range, as in the usual 8-bit integer approximation
+BT601 = np.array([[66, 129, 25], [-38, -74, 112], [112, -94, -18]], np.float32) / 256
+
+
+class FrameCapture:
+    def __init__(self, path, surface, fps, slots=CAPTURE_SLOTS):
+        """Start capturing frames the size and format of ``surface`` to ``path``."""
+        if surface.get_bytesize() != 4:
+            raise ValueError("capture needs a 32-bit surface")
+        self.path = path
+        self.size = w, h = surface.get_size()
+        self.fps = fps
+        self.format = os.path.splitext(path)[1].lower().lstrip(".")
+        if self.format not in ("y4m", "raw"):
+            self.format = "png"
+        if self.format == "y4m" and (w % 2 or h % 2):
+            raise ValueError("Y4M capture needs an even width and height")
+        # Byte offset of red, green and blue within a pixel
+        self.channels = tuple(shift // 8 for shift in surface.get_shifts()[:3])
+        order = ["0"] * 4
+        for name, offset in zip("rgb", self.channels):
+            order[offset] = name
+        if surface.get_masks()[3]:
+            order[surface.get_shifts()[3] // 8] = "a"
+        self.pix_fmt = "".join(order)
+
+        self.frames = 0  # frames handed to the workers
+        self.dropped = 0
+        shape = (slots, h, surface.get_pitch())
+        self.memory = SharedMemory(create=True, size=int(np.prod(shape)))
+        self.ring = np.ndarray(shape, np.uint8, self.memory.buf)
+        self.free = list(range(slots))
+
+        if self.format == "png":
+            os.makedirs(path, exist_ok=True)
+            count = max(1, min(MAX_PNG_WORKERS, (os.cpu_count() or 2) - 1))
+        else:
+            count = 1  # A stream has to be written in order
+        # Spawned workers re-import the game's main module, and with it pygame
+        os.environ["PYGAME_HIDE_SUPPORT_PROMPT"] = "1"
+        context = multiprocessing.get_context("spawn")
+        self.jobs = context.Queue()
+        self.done = context.Queue()
+        spec = (self.memory.name, shape, self.size, self.channels)
+        self.workers = [context.Process(target=_work, args=(spec, self.format, path, fps, self.jobs, self.done),
+                                        daemon=True)
+                        for _ in range(count)]
+        try:
+            for worker in self.workers:
+                worker.start()
+            self._wait_ready()
+        except BaseException:
+            self.stop()
+            raise
+
+    def _wait_ready(self):
+        deadline = time.monotonic() + STARTUP_TIMEOUT
+        waiting = len(self.workers)
+        while waiting:
+            try:
+                self.done.get(timeout=0.1)
+                waiting -= 1
+            except queue.Empty:
+                if any(worker.exitcode is not None for worker in self.workers):
+                    raise RuntimeError("a capture worker exited while starting") from None
+                if time.monotonic() > deadline:
+                    raise RuntimeError("capture workers did not start in time") from None
+
+    def add(self, surface):
+        """Queue a copy of ``surface``; return False if it had to be dropped."""
+        done = self.done
+        while True:
+            try:
+                self.free.append(done.get_nowait())
+            except queue.Empty:
+                break
+        if not self.free:
+            self.dropped += 1
+            return False
+        slot = self.free.pop()
+        pixels = surface.get_view("1")
+        self.ring[slot].reshape(-1)[:] = np.frombuffer(pixels, np.uint8)
+        del pixels  # Unlocks the surface
+        self.jobs.put((slot, self.frames))
+        self.frames += 1
+        return True
+
+    def close(self):
+        """Wait for every queued frame to be written, then stop the workers."""
+        for _ in self.workers:
+            self.jobs.put(None)
+        for worker in self.workers:
+            worker.join()
+        self.stop()
+
+    def stop(self):
+        """Stop the workers, dropping any frames not written yet, and free the ring."""
+        for worker in self.workers:
+            if worker.is_alive():
+                worker.terminate()
+            worker.join()
+        self.jobs.close()
+        self.done.close()
+        del self.ring
+        self.memory.close()
+        self.memory.unlink()
+
+
+# --- Workers ---
+def _work(spec, fmt, path, fps, jobs, done):
+    memory_name, shape, size, channels = spec
+    memory = SharedMemory(memory_name)
+    ring = np.ndarray(shape, np.uint8, memory.buf)
+    w, h = size
+    try:
+        if fmt == "png":
+            _write_pngs(ring, size, channels, path, jobs, done)
+        else:
+            with open(path, "wb") as f:
+                if fmt == "y4m":
+                    f.write(f"YUV4MPEG2 W{w} H{h} F{fps}:1 Ip A1:1 C420jpeg\n".encode())
+                    weights = _yuv_weights(channels)
+                done.put(READY)
+                while (job := jobs.get()) is not None:
+                    slot, _ = job
+                    pixels = ring[slot, :, :w * 4]
+                    if fmt == "y4m":
+                        f.write(b"FRAME\n")
+                        f.write(_yuv420(pixels.reshape(h, w, 4), weights))
+                    else:
+                        f.write(np.ascontiguousarray(pixels))
+                    done.put(slot)
+    finally:
+        del ring
+        memory.close()
+
+
+def _write_pngs(ring, size, channels, directory, jobs, done):
+    import pygame
+    w, h = size
+    done.put(READY)
+    while (job := jobs.get()) is not None:
+        slot, index = job
+        rgb = np.ascontiguousarray(ring[slot, :, :w * 4].reshape(h, w, 4)[..., channels])
+        done.put(slot)  # Copied out, so the slot can take the next frame already
+        pygame.image.save(pygame.image.frombuffer(rgb, size, "RGB"),
+                          os.path.join(directory, f"frame_{index:06d}.png"))
+
+
+def _yuv_weights(channels):
+    """Matrices turning pixels into Y, and horizontal pixel pairs into four times their U, V."""
+    weights = np.zeros((4, 3), np.float32)
+    weights[list(channels)] = BT601.T
+    return weights[:, :1], np.vstack([weights[:, 1:], weights[:, 1:]]) / 4
+
+
+def _yuv420(pixels, weights):
+    """Planar Y, U, V bytes of an (h, w, 4) pixel array, chroma averaged over 2x2 blocks."""
+    h, w = pixels.shape[:2]
+    to_y, to_uv = weights
+    # Whole-array products keep this to a few milliseconds; Y and the
+    # offsets get +0.5 so the truncating casts round
+    y = pixels.reshape(-1, 4) @ to_y
+    pairs = pixels.reshape(h, w // 2, 8) @ to_uv
+    uv = pairs[0::2] + pairs[1::2] + 128.5
+    planes = np.empty(h * w * 3 // 2, np.uint8)
+    np.add(y.reshape(-1), 16.5, out=planes[:h * w], casting="unsafe")
+    planes[h * w:].reshape(2, -1)[:] = uv.reshape(-1, 2).T
+    return planes
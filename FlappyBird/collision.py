@@ -0,0 +1,268 @@
+"""Swept collision for a bird that stops flapping.
+
+Between flaps the bird follows a fixed path: velocity grows by ``gravity``
+each frame up to ``MAX_FALL_SPEED`` and ``y`` adds the velocity, so after
+``k`` frames ``y`` is a quadratic in ``k`` that turns into a straight line
+once the fall speed is capped. Pipes move left by a whole number of pixels
+per frame. That makes it possible to work out, without stepping, on which
+frame the bird first touches a pipe or the floor:
+
+* Only frames where a pipe's body overlaps the hitbox horizontally matter,
+  and those form a short integer range per pipe (``overlap``).
+* Within that range the hitbox clears the pipe while ``y`` stays inside a
+  band given by the gap; because the hitbox uses ``int(y)`` the band edges
+  are whole pixels, and the first frame outside it comes from solving the
+  quadratic (``Path``).
+
+The closed form and the running float sum of ``BirdBody.update`` can land
+on either side of a whole pixel, so both users treat a path that comes
+within ``EDGE_MARGIN`` of an edge as a possible contact and settle it with
+the game's own arithmetic:
+
+* ``time_of_impact`` answers "how long until I crash if I never flap again"
+  for bots. It redoes the bird's additions up to each possible contact and
+  tests the hitbox there, then carries on from that exact state.
+* ``fast_forward`` advances a ``World`` many frames at a time: frames where
+  nothing can happen are coasted through with the bird's arithmetic alone,
+  and every frame that might matter (a possible contact, a spawn, a point,
+  the ceiling) goes through ``World.step``.
+
+Both give exactly what stepping frame by frame would.
+"""
+import math
+
+from simulation import FLOOR_Y, MAX_FALL_SPEED, PIPE_INSET, PIPE_SPAWN_X, PIPE_SPACING, PIPE_DESPAWN_X
+
+# How close the closed-form path may get to an edge before the frame is
+# checked with the game's own arithmetic. Far above the rounding drift of a few hundred
+# frames of float additions, far below a pixel.
+EDGE_MARGIN = 1e-6
+
+
+class Path:
+    """Closed-form height of a bird that does not flap, ``y(k)`` frames after ``origin``."""
+
+    def __init__(self, y, velocity, gravity, origin=0):
+        self.y0 = y
+        self.v0 = velocity
+        self.gravity = gravity
+        self.origin = origin
+        # Frames before the velocity is capped, and frames spent still rising
+        self.capped_after = max(0, math.floor((MAX_FALL_SPEED - velocity) / gravity))
+        self.lowest = origin + (max(0, math.ceil(-velocity / gravity) - 1) if velocity < 0 else 0)
+
+    def velocity(self, k):
+        return min(self.v0 + (k - self.origin) * self.gravity, MAX_FALL_SPEED)
+
+    def y(self, k):
+        j = k - self.origin
+        cap = self.capped_after
+        if j > cap:
+            return self._y(cap) + (j - cap) * MAX_FALL_SPEED
+        return self._y(j)
+
+    def _y(self, j):
+        return self.y0 + j * self.v0 + self.gravity * j * (j + 1) / 2
+
+    def _root(self, threshold, rising):
+        """Real frame at which the path crosses ``threshold``, rising or falling."""
+        g = self.gravity
+        b = self.v0 + g / 2
+        disc = b * b - 2 * g * (self.y0 - threshold)
+        if disc < 0:
+            return self.origin
+        j = (-b + math.sqrt(disc) if rising else -b - math.sqrt(disc)) / g
+        cap = self.capped_after
+        if rising and j > cap:
+            j = cap + (threshold - self._y(cap)) / MAX_FALL_SPEED
+        return self.origin + math.ceil(j)
+
+    def first_below(self, threshold, first, last):
+        """First frame in ``first..last`` with ``y < threshold``, or None."""
+        if first > last:
+            return None
+        if self.y(first) < threshold:
+            return first
+        end = min(self.lowest, last)
+        if first >= end or self.y(end) >= threshold:
+            return None  # Never dips that low before it starts falling again
+        return _first(lambda k: self.y(k) < threshold, self._root(threshold, False), first, end)
+
+    def first_at_or_above(self, threshold, first, last):
+        """First frame in ``first..last`` with ``y >= threshold``, or None."""
+        if first > last:
+            return None
+        if self.y(first) >= threshold:
+            return first
+        start = max(first, self.lowest)
+        if start > last or self.y(last) < threshold:
+            return None
+        return _first(lambda k: self.y(k) >= threshold, self._root(threshold, True), start, last)
+
+
+def _first(test, guess, first, last):
+    """Smallest k in ``first..last`` passing ``test``, which flips once from False to True there."""
+    k = min(max(guess, first), last + 1)
+    while k > first and test(k - 1):
+        k -= 1
+    while k <= last and not test(k):
+        k += 1
+    return k if k <= last else None
+
+
+def overlap(x, speed, left, right, width):
+    """Frames ``(first, last)`` during which a pipe now at ``x`` overlaps ``left..right``.
+
+    A pipe has moved ``k * speed`` after ``k`` frames. The range is empty
+    (``first > last``) if the body never overlaps the hitbox from here on.
+    """
+    first = max(1, (x + PIPE_INSET - right) // speed + 1)
+    last = -((left - x - width + PIPE_INSET) // speed) - 1
+    return first, last
+
+
+def first_contact(path, bird, pipes, first, last, margin=0.0):
+    """First frame in ``first..last`` at which ``path`` touches a pipe or the floor.
+
+    Frames count from where ``pipes`` stand now. With a ``margin`` the path
+    counts as touching when it comes within that many pixels of an edge.
+    """
+    left, top, right, bottom = bird.hitbox()
+    top -= bird.center_y
+    bottom -= bird.center_y
+    best = path.first_at_or_above(FLOOR_Y - margin, first, last)
+    if best is not None:
+        last = best
+    for pipe in pipes:
+        k0, k1 = overlap(pipe.x, pipe.speed, left, right, pipe.width)
+        k0 = max(k0, first)
+        k1 = min(k1, last)
+        if k0 > k1:
+            continue
+        # The hitbox clears both pipes while int(y) keeps it inside the gap
+        low = pipe.height - top
+        high = pipe.height + pipe.gap - bottom + 1
+        for k in (path.first_below(low + margin, k0, k1), path.first_at_or_above(high - margin, k0, k1)):
+            if k is not None and (best is None or k < best):
+                best = last = k
+    return best
+
+
+def time_of_impact(world, frames):
+    """Frames until the bird hits a pipe or the floor if it never flaps again.
+
+    Only pipes already in ``world.pipes`` are considered; returns None if
+    the bird is still clear after ``frames`` frames.
+    """
+    bird = world.bird
+    gravity = bird.gravity
+    left, top, right, bottom = bird.hitbox()
+    y = bird.y
+    velocity = bird.velocity
+    done = 0  # frames known to be clear, ending with the bird at y, velocity
+    while True:
+        path = Path(y, velocity, gravity, done)
+        ceiling = path.first_below(EDGE_MARGIN, done + 1, frames)
+        k = first_contact(path, bird, world.pipes, done + 1, frames if ceiling is None else ceiling, EDGE_MARGIN)
+        if k is None:
+            k = ceiling
+        if k is None:
+            return None
+        # Nothing comes near an edge before frame k, so only frame k needs
+        # checking, with the bird where the game's own additions put it
+        y, velocity, _ = _fall(y, velocity, gravity, k - done)
+        if y >= FLOOR_Y:
+            return k
+        shift = int(y) - bird.center_y
+        for pipe in world.pipes:
+            # The pipe k frames on, or the hitbox as far the other way
+            moved = k * pipe.speed
+            if pipe.collides(left + moved, top + shift, right + moved, bottom + shift):
+                return k
+        if y < 0: y = 0.0
+        done = k
+
+
+def fast_forward(world, frames):
+    """Advance ``world`` by up to ``frames`` frames without flapping.
+
+    Leaves the world exactly as the same number of ``world.step(False)``
+    calls would, except that it stops right after the frame the bird
+    crashes on, and once it has landed: in ``GAMEOVER`` ``step`` changes
+    nothing, not even the frame. Returns ``(observation, reward, done)``
+    like ``step``, with the reward summed over every frame.
+    """
+    end = world.frame + frames
+    reward = 0
+    while world.frame < end and world.state != "GAMEOVER":
+        playing = world.state == "PLAYING"
+        if playing:
+            quiet = _quiet_frames(world, end - world.frame)
+            if quiet:
+                _coast(world, quiet)
+                if world.frame == end:
+                    break
+        _, gained, done = world.step(False)
+        reward += gained
+        if done and playing:
+            break
+    return world.observe(), reward, world.state != "PLAYING"
+
+
+def _quiet_frames(world, limit):
+    """How many of the next ``limit`` frames can be coasted through."""
+    bird = world.bird
+    pipes = world.pipes
+    newest = pipes[-1]
+    oldest = pipes[0]
+    # Spawns, points and despawns are left to World.step
+    stop = min(limit + 1,
+               max(1, (newest.x - (PIPE_SPAWN_X - PIPE_SPACING)) // newest.speed + 2),
+               (oldest.x - PIPE_DESPAWN_X) // oldest.speed + 1)
+    for pipe in pipes:
+        if not pipe.passed:
+            stop = min(stop, (pipe.x - bird.x) // pipe.speed + 1)
+    if stop <= 1:
+        return 0
+
+    path = Path(bird.y, bird.velocity, bird.gravity)
+    # So are possible contacts and the ceiling clamp
+    for k in (path.first_below(EDGE_MARGIN, 1, stop - 1),
+              first_contact(path, bird, pipes, 1, stop - 1, EDGE_MARGIN)):
+        if k is not None and k < stop:
+            stop = k
+    return stop - 1
+
+
+def _coast(world, frames):
+    """Run ``frames`` frames in which nothing but movement happens."""
+    bird = world.bird
+    y, velocity, rising = _fall(bird.y, bird.velocity, bird.gravity, frames)
+    bird.velocity = velocity
+    bird.y = y
+    bird.center_y = int(y)
+    # The velocity only grows, so the rising frames all come first
+    if rising == frames:
+        bird.angle = 20
+    else:
+        angle = 20 if rising else bird.angle
+        if angle > -90:
+            angle -= 3 * min(frames - rising, math.ceil((angle + 90) / 3))
+        bird.angle = angle
+
+    for pipe in world.pipes:
+        pipe.x -= pipe.speed * frames
+    world.events.clear()
+    world.frame += frames
+
+
+def _fall(y, velocity, gravity, frames):
+    """Height and velocity ``frames`` frames on, and how many of them rose."""
+    rising = 0
+    # Same float operations, in the same order, as BirdBody.update
+    for _ in range(frames):
+        velocity += gravity
+        if velocity > MAX_FALL_SPEED: velocity = MAX_FALL_SPEED
+        y += velocity
+        if velocity < 0: rising += 1
+    return y, velocity, rising
@@ -1,18 +1,44 @@
+import argparse
 import random
 import pygame
 import os
 import math
+import time
+import weakref
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+try:
+    from pygame._sdl2.video import Renderer, Texture, Window
+except ImportError:  # Only the surface backend is available
+    Renderer = Texture = Window = None
+
+from assetcache import AssetCache, file_key, make_key
+from autopilot import Autopilot
+from simulation import (BASE_WIDTH, BASE_HEIGHT, GROUND_HEIGHT, PIPE_WIDTH, FPS, DIFFICULTY,
+                        BirdBody, PipeBody, World)
+from profiler import FrameProfiler
+from quality import QUALITY_LEVELS, QualityGovernor
+from replay import Recorder
+from spectate import SpectatorServer, parse_address
 
 # --- Global Constants ---
-BASE_WIDTH = 400
-BASE_HEIGHT = 600
 SCREEN_WIDTH = BASE_WIDTH
 SCREEN_HEIGHT = BASE_HEIGHT
-GROUND_HEIGHT = 50
-PIPE_WIDTH = 70
 PIPE_CAP_HEIGHT = 30
-BIRD_START_X = 50
-FPS = 60
+PIPE_CACHE_SIZE = 32  # pipe halves kept pre-rendered; a screenful needs about 8
+BIRD_ROTATION_STEP = 1  # degrees between cached bird rotations
+MAX_CATCHUP_STEPS = 5  # simulation steps per rendered frame before dropping time
+TRACE_FRAMES = FPS * 60 * 10  # frames kept for --trace export
+BIRD_WIDTH = 50
+TEXT_CACHE_SIZE = 256
+BUTTON_CACHE_SIZE = 128
+AUDIO_BUFFER = 512  # mixer buffer in samples, pygame's default
+LOW_LATENCY_AUDIO_BUFFER = 256
+SOUND_CHANNELS = ("flap", "point", "hit")  # reserved one each in --low-latency mode
+AUTOPILOT_RESTART = FPS * 2  # ticks the game over screen stays up before --autopilot plays again
+# Presses that wake a --low-latency frame early instead of waiting for the next step
+WAKE_EVENTS = (pygame.KEYDOWN, pygame.MOUSEBUTTONDOWN, pygame.QUIT)
 
 # --- Colors ---
 COLOR_SKY = (20, 20, 40)
@@ -24,37 +50,33 @@ COLOR_PIPE_SHADOW = (0, 80, 0)
 COLOR_OUTLINE = (0, 0, 0)
 COLOR_GROUND = (50, 50, 50)
 COLOR_GROUND_TOP = (0, 255, 150)
+COLOR_KEY = (255, 0, 255)  # transparent in cached sprites
 
 # --- UI Colors (Apple Style) ---
 COLOR_BUTTON_BG = (255, 255, 255, 220) 
 COLOR_BUTTON_HOVER = (255, 255, 255, 255)
 COLOR_TEXT_DARK = (40, 40, 40)
 
-# --- Difficulty Defaults ---
-DIFFICULTY = {
-    "EASY": {"gap": 200, "speed": 3, "gravity": 0.4, "flap": -7},
-    "MEDIUM": {"gap": 170, "speed": 4, "gravity": 0.45, "flap": -7.5},
-    "HARD": {"gap": 140, "speed": 5, "gravity": 0.55, "flap": -8.5},
-    "CUSTOM": {"gap": 170, "speed": 4, "gravity": 0.45, "flap": -7.5} # Default custom
-}
-
-HITBOX_SHRINK_X = 32
-HITBOX_SHRINK_Y = 20
-
-pygame.init()
-pygame.mixer.init()
-
 # --- Fullscreen Support ---
+# The window and everything drawn into it are created by init(), so the
+# module can be imported without opening a display.
 is_fullscreen = False
-screen = pygame.display.set_mode((SCREEN_WIDTH, SCREEN_HEIGHT))
-game_surface = pygame.Surface((BASE_WIDTH, BASE_HEIGHT))  # Render game at base resolution
-pygame.display.set_caption("Flappy Bird: Custom Edition")
-clock = pygame.time.Clock()
+screen = None  # Display surface; None with the texture backend
+window = renderer = None  # Texture backend only
+game_surface = None  # Render game at base resolution
+clock = None
 
 def toggle_fullscreen():
     global screen, is_fullscreen, SCREEN_WIDTH, SCREEN_HEIGHT
     is_fullscreen = not is_fullscreen
-    if is_fullscreen:
+    if window is not None:
+        if is_fullscreen:
+            window.set_fullscreen(desktop=True)
+        else:
+            window.set_windowed()
+            window.size = (BASE_WIDTH, BASE_HEIGHT)
+        SCREEN_WIDTH, SCREEN_HEIGHT = window.size
+    elif is_fullscreen:
         screen = pygame.display.set_mode((0, 0), pygame.FULLSCREEN)
         info = pygame.display.Info()
         SCREEN_WIDTH = info.current_w
@@ -63,63 +85,434 @@ def toggle_fullscreen():
         SCREEN_WIDTH = BASE_WIDTH
         SCREEN_HEIGHT = BASE_HEIGHT
         screen = pygame.display.set_mode((SCREEN_WIDTH, SCREEN_HEIGHT))
+    presenter.reset()
+
+def get_scale_and_offset(output_scale=1.0):
+    """Calculate scale factor and offset to center the game on screen
 
-def get_scale_and_offset():
-    """Calculate scale factor and offset to center the game on screen"""
+    ``output_scale`` shrinks the game below the size that fills the screen,
+    but never below the base resolution.
+    """
     scale_x = SCREEN_WIDTH / BASE_WIDTH
     scale_y = SCREEN_HEIGHT / BASE_HEIGHT
     scale = min(scale_x, scale_y)  # Maintain aspect ratio
+    if output_scale < 1 and scale > 1:
+        scale = max(1.0, scale * output_scale)
     offset_x = (SCREEN_WIDTH - BASE_WIDTH * scale) // 2
     offset_y = (SCREEN_HEIGHT - BASE_HEIGHT * scale) // 2
     return scale, offset_x, offset_y
 
 def scale_mouse_pos(pos):
     """Convert screen mouse position to game coordinates"""
-    scale, offset_x, offset_y = get_scale_and_offset()
-    return ((pos[0] - offset_x) / scale, (pos[1] - offset_y) / scale)
+    scale = presenter.scale
+    return ((pos[0] - presenter.target.x) / scale, (pos[1] - presenter.target.y) / scale)
+
+# --- PRESENTATION ---
+profiler = FrameProfiler()
+
+class Presenter:
+    """Copies game_surface to the window, touching only what changed.
+
+    The scale and letterbox geometry are worked out once per display mode.
+    Each frame, callers either mark the whole game area dirty or list the
+    regions that changed; only those are scaled straight into the window
+    and pushed with ``display.update``. A frame with nothing dirty costs
+    nothing to present.
+    """
+    scales_output = True  # quality levels' output_scale applies
+
+    def __init__(self):
+        self.reset()
+
+    def reset(self):
+        """Recompute geometry after a display mode or quality change."""
+        scale, offset_x, offset_y = get_scale_and_offset(quality["output_scale"])
+        self.scale = scale
+        self.target = pygame.Rect(int(offset_x), int(offset_y),
+                                  int(BASE_WIDTH * scale), int(BASE_HEIGHT * scale))
+        self.view = screen.subsurface(self.target)
+        # transform.scale samples source pixel floor(x * src / dst), so regions
+        # starting on a multiple of src / gcd(src, dst) scale exactly as the
+        # whole frame would.
+        self.period = (BASE_WIDTH // math.gcd(BASE_WIDTH, self.target.w or 1),
+                       BASE_HEIGHT // math.gcd(BASE_HEIGHT, self.target.h or 1))
+        self.mode_changed = True
+        self.full_frame = True
+        self.dirty = []
+        self.updated = []  # screen rects of the dirty regions, reused every frame
+        self.pixels = 0  # window pixels the last present wrote
+
+    def mark_all_dirty(self):
+        self.full_frame = True
+
+    def mark_dirty(self, rect):
+        if rect: self.dirty.append(rect)
+
+    def present(self):
+        if self.mode_changed:
+            screen.fill((0, 0, 0))  # Black letterbox bars, drawn once per mode
+        if self.full_frame or self.mode_changed:
+            self.copy_all()
+            self.pixels = self.target.w * self.target.h
+            profiler.lap("scale")
+            if self.mode_changed: pygame.display.flip()
+            else: pygame.display.update(self.target)
+        elif self.dirty:
+            updated = self.updated
+            pixels = 0
+            for rect in self.dirty:
+                rect = self.copy(rect)
+                updated.append(rect)
+                pixels += rect.w * rect.h
+            self.pixels = pixels
+            profiler.lap("scale")
+            pygame.display.update(updated)
+            updated.clear()
+        else:
+            self.pixels = 0
+            profiler.lap("scale")
+        profiler.lap("flip")
+        self.mode_changed = False
+        self.full_frame = False
+        self.dirty.clear()
+
+    def copy_all(self):
+        """Scale the whole of game_surface into the window, without cutting out regions."""
+        if self.scale == 1:
+            self.view.blit(game_surface, (0, 0))
+        else:
+            pygame.transform.scale(game_surface, self.target.size, self.view)
+
+    def copy(self, rect):
+        """Scale one region of game_surface into the window; return its screen rect."""
+        rect = rect.clip(game_surface.get_rect())
+        if self.scale == 1:
+            self.view.blit(game_surface, rect, rect)
+            return rect.move(self.target.topleft)
+        period_x, period_y = self.period
+        left = rect.left // period_x * period_x
+        top = rect.top // period_y * period_y
+        right = min(-(-rect.right // period_x) * period_x, BASE_WIDTH)
+        bottom = min(-(-rect.bottom // period_y) * period_y, BASE_HEIGHT)
+        w, h = self.target.size
+        dest = pygame.Rect(left * w // BASE_WIDTH, top * h // BASE_HEIGHT, 0, 0)
+        dest.size = (right * w // BASE_WIDTH - dest.x, bottom * h // BASE_HEIGHT - dest.y)
+        if dest.w and dest.h:
+            src = game_surface.subsurface((left, top, right - left, bottom - top))
+            pygame.transform.scale(src, dest.size, self.view.subsurface(dest))
+        return dest.move(self.target.topleft)
+
+class TextureCanvas:
+    """Stands in for game_surface with the texture backend.
+
+    ``blit`` has the same signature and result as ``Surface.blit``, but
+    copies a texture on the renderer instead of pixels. Each surface is
+    uploaded the first time it is drawn and its texture is kept for as long
+    as the surface lives, so sprites from the caches are uploaded once.
+    Surfaces must not be drawn on after they have been blitted here.
+    """
+    def __init__(self, size):
+        self.rect = pygame.Rect((0, 0), size)
+        self.textures = weakref.WeakKeyDictionary()
+
+    def get_size(self):
+        return self.rect.size
+
+    def get_rect(self):
+        return self.rect.copy()
+
+    def blit(self, source, dest, area=None):
+        texture = self.textures.get(source)
+        if texture is None:
+            texture = self.textures[source] = Texture.from_surface(renderer, source)
+        if area is not None:
+            area = pygame.Rect(area).clip(source.get_rect())
+            size = area.size
+        else:
+            size = source.get_size()
+        rect = pygame.Rect(int(dest[0]), int(dest[1]), *size)
+        texture.draw(area, rect)
+        return rect.clip(self.rect)
+
+class TexturePresenter:
+    """Shows a frame drawn on a TextureCanvas.
+
+    The renderer's logical size is the game's base resolution, so SDL
+    scales and letterboxes the frame on the way to the window, on the GPU
+    or in SDL's software renderer. Every frame is drawn in full, so the
+    dirty regions the game reports are not needed, and the game always
+    fills the window whatever the quality level's output_scale.
+    """
+    scales_output = False
+
+    def __init__(self):
+        self.reset()
+
+    def reset(self):
+        scale, offset_x, offset_y = get_scale_and_offset()
+        self.scale = scale
+        self.target = pygame.Rect(int(offset_x), int(offset_y),
+                                  int(BASE_WIDTH * scale), int(BASE_HEIGHT * scale))
+        renderer.logical_size = (BASE_WIDTH, BASE_HEIGHT)
+        self.mode_changed = True
+        self.pixels = self.target.w * self.target.h  # drawn in full every frame
+
+    def mark_all_dirty(self):
+        pass
+
+    def mark_dirty(self, rect):
+        pass
+
+    def present(self):
+        profiler.lap("scale")
+        renderer.present()
+        # Start the next frame from black, which is also the letterbox colour
+        renderer.draw_color = (0, 0, 0, 255)
+        renderer.clear()
+        profiler.lap("flip")
+        self.mode_changed = False
+
+presenter = None
+
+# --- QUALITY ---
+quality = QUALITY_LEVELS[0]
+
+def set_quality(level):
+    global quality
+    quality = QUALITY_LEVELS[level]
+    profiler.status["quality"] = f"quality {level}: {quality['name']}"
+    presenter.reset()
+
+def idle_quality_levels():
+    """Levels that would show and cost exactly what the level before them does.
+
+    Which ones depends on the display mode: output_scale never shrinks the
+    game below its base size, and the texture backend ignores it.
+    """
+    def effect(settings):
+        output_scale = settings["output_scale"] if presenter.scales_output else 1.0
+        return ({key: value for key, value in settings.items() if key not in ("name", "output_scale")},
+                get_scale_and_offset(output_scale)[0])
+    return [level for level in range(1, len(QUALITY_LEVELS))
+            if effect(QUALITY_LEVELS[level]) == effect(QUALITY_LEVELS[level - 1])]
 
 # Fonts
-try:
-    ui_font = pygame.font.SysFont("arial", 25, bold=True)
-    title_font = pygame.font.SysFont("arial", 50, bold=True)
-    score_font = pygame.font.SysFont("arial", 40, bold=True)
-    small_label_font = pygame.font.SysFont("arial", 20, bold=True)
-except:
-    ui_font = pygame.font.Font(None, 30)
-    title_font = pygame.font.Font(None, 60)
-    score_font = pygame.font.Font(None, 50)
-    small_label_font = pygame.font.Font(None, 25)
+ui_font = title_font = score_font = small_label_font = hud_font = None
+asset_cache = AssetCache()
+
+def load_fonts():
+    global ui_font, title_font, score_font, small_label_font, hud_font
+    try:
+        ui_font = asset_cache.sysfont("arial", 25, bold=True)
+        title_font = asset_cache.sysfont("arial", 50, bold=True)
+        score_font = asset_cache.sysfont("arial", 40, bold=True)
+        small_label_font = asset_cache.sysfont("arial", 20, bold=True)
+    except:
+        ui_font = pygame.font.Font(None, 30)
+        title_font = pygame.font.Font(None, 60)
+        score_font = pygame.font.Font(None, 50)
+        small_label_font = pygame.font.Font(None, 25)
+    hud_font = pygame.font.Font(None, 18)
+
+# --- SPRITE CACHES ---
+class SurfaceCache:
+    """Least-recently-used cache of surfaces built on demand by ``build(*key)``."""
+    def __init__(self, build, max_size):
+        self.build = build
+        self.max_size = max_size
+        self.items = OrderedDict()
+
+    def get(self, key):
+        surf = self.items.get(key)
+        if surf is None:
+            surf = self.items[key] = self.build(*key)
+            if len(self.items) > self.max_size:
+                self.items.popitem(last=False)
+        else:
+            self.items.move_to_end(key)
+        return surf
+
+class RotationCache:
+    """Every rotation of a sprite the bird can show, rendered once.
+
+    The bird's angle only takes whole-degree values between -91 and 20, so
+    with the default ``step`` each lookup returns exactly what
+    ``transform.rotate`` would. A finer ``step`` (e.g. 0.25) gives smoother
+    tilting for interpolated angles at the cost of more frames in memory.
+    """
+    def __init__(self, image, min_angle=-91, max_angle=20, step=1):
+        self.min_angle = min_angle
+        self.step = step
+        self.frames = []
+        for i in range(round((max_angle - min_angle) / step) + 1):
+            rotated = pygame.transform.rotate(image, min_angle + i * step)
+            # Offsets from the sprite centre to its top-left, as get_rect(center=...) computes them
+            self.frames.append((rotated, rotated.get_width() // 2, rotated.get_height() // 2))
+
+    def get(self, angle):
+        """Return ``(surface, half_width, half_height)`` for the nearest cached angle."""
+        i = round((angle - self.min_angle) / self.step)
+        return self.frames[min(max(i, 0), len(self.frames) - 1)]
+
+def render_pipe_half(height, is_top_pipe):
+    """Draw one pipe half once so each frame only has to blit it."""
+    surf = pygame.Surface((PIPE_WIDTH, height))
+    surf.fill(COLOR_KEY)
+    surf.set_colorkey(COLOR_KEY, pygame.RLEACCEL)
+    draw_mario_pipe(surf, 0, 0, PIPE_WIDTH, height, is_top_pipe)
+    return surf
+
+def render_text(font, text, color):
+    return font.render(text, True, color)
+
+def render_button(text, w, h, hovered):
+    """Shadow, rounded body, outline and label of a button, as one sprite.
+
+    The shadow sits 4px below the body, so the sprite is ``h + 4`` tall.
+    """
+    sprite = pygame.Surface((w, h + 4), pygame.SRCALPHA)
+    pygame.draw.rect(sprite, (0, 0, 0), (0, 4, w, h), border_radius=15)
+    color = COLOR_BUTTON_HOVER if hovered else COLOR_BUTTON_BG
+    shape_surf = pygame.Surface((w, h), pygame.SRCALPHA)
+    pygame.draw.rect(shape_surf, color, (0, 0, w, h), border_radius=15)
+    sprite.blit(shape_surf, (0, 0))
+    pygame.draw.rect(sprite, (255, 255, 255), (0, 0, w, h), 2, border_radius=15)
+    text_surf = text_sprites.get((ui_font, text, COLOR_TEXT_DARK))
+    sprite.blit(text_surf, text_surf.get_rect(center=(w // 2, h // 2)))
+    return sprite
+
+def render_overlay(w, h, color):
+    overlay = pygame.Surface((w, h), pygame.SRCALPHA)
+    overlay.fill(color)
+    return overlay
+
+pipe_sprites = SurfaceCache(render_pipe_half, PIPE_CACHE_SIZE)
+text_sprites = SurfaceCache(render_text, TEXT_CACHE_SIZE)
+button_sprites = SurfaceCache(render_button, BUTTON_CACHE_SIZE)
+overlay_sprites = SurfaceCache(render_overlay, 4)
 
 # --- ASSETS ---
-def load_assets():
-    assets = {}
-    script_dir = os.path.dirname(os.path.abspath(__file__))
-    def get_path(filename): return os.path.join(script_dir, filename)
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+CITY_CACHE = "city.bin"
 
-    try:
-        bird_img = pygame.image.load(get_path("flappy.png")).convert_alpha()
+def get_path(filename): return os.path.join(SCRIPT_DIR, filename)
+
+def for_display(surface, alpha=True):
+    """``surface`` in the window's pixel format, which blits fastest; textures take any format."""
+    if screen is None:
+        return surface
+    return surface.convert_alpha() if alpha else surface.convert()
+
+def load_bird():
+    """The bird sprite scaled to BIRD_WIDTH, from the asset cache when it is current."""
+    path = get_path("flappy.png")
+    key = file_key(path, BIRD_WIDTH)
+    bird = asset_cache.load_surface("bird.bin", key)
+    if bird is None:
+        bird_img = for_display(pygame.image.load(path))
         img_w = bird_img.get_width()
         img_h = bird_img.get_height()
         aspect_ratio = img_w / img_h
-        target_width = 50 
+        target_width = BIRD_WIDTH
         target_height = int(target_width / aspect_ratio)
-        assets['bird'] = pygame.transform.scale(bird_img, (target_width, target_height))
-        
-        assets['flap'] = pygame.mixer.Sound(get_path("flapping.wav"))
-        assets['point'] = pygame.mixer.Sound(get_path("point.wav"))
-        assets['hit'] = pygame.mixer.Sound(get_path("hit.wav"))
-        assets['die'] = pygame.mixer.Sound(get_path("hit.wav")) 
+        bird = pygame.transform.scale(bird_img, (target_width, target_height))
+        asset_cache.save_surface("bird.bin", key, bird)
+    return for_display(bird)
+
+def load_assets():
+    """Images needed for the first frame; sounds follow in init_audio()."""
+    assets = {'flap': None, 'point': None, 'hit': None, 'die': None}
+    try:
+        assets['bird'] = load_bird()
     except Exception as e:
         print(f"Asset Warning: {e}")
         bg = pygame.Surface((50, 36))
         bg.fill((255, 255, 0))
         assets['bird'] = bg
-        assets['flap'] = None; assets['point'] = None; assets['hit'] = None; assets['die'] = None
+    assets['bird_rotations'] = RotationCache(assets['bird'], step=BIRD_ROTATION_STEP)
     return assets
 
-assets = load_assets()
+def init_audio(low_latency=False):
+    """Start the mixer and load the sounds.
+
+    In low-latency mode the mixer gets a smaller buffer, so a sound reaches
+    the speakers sooner, and each game sound gets a reserved channel, so
+    it starts at once instead of waiting for or stealing a free one.
+    """
+    global audio_delay
+    buffer = LOW_LATENCY_AUDIO_BUFFER if low_latency else AUDIO_BUFFER
+    try:
+        pygame.mixer.pre_init(buffer=buffer)
+        pygame.mixer.init()
+        if low_latency:
+            pygame.mixer.set_reserved(len(SOUND_CHANNELS))
+            for index, name in enumerate(SOUND_CHANNELS):
+                sound_channels[name] = pygame.mixer.Channel(index)
+        # A sound is heard about one buffer after it is started
+        audio_delay = buffer / pygame.mixer.get_init()[0]
+        assets['flap'] = pygame.mixer.Sound(get_path("flapping.wav"))
+        assets['point'] = pygame.mixer.Sound(get_path("point.wav"))
+        assets['hit'] = assets['die'] = pygame.mixer.Sound(get_path("hit.wav"))
+    except Exception as e:
+        print(f"Asset Warning: {e}")
+
+def city_key():
+    return make_key("city", BASE_WIDTH, BASE_HEIGHT, GROUND_HEIGHT)
+
+def bake_next_city():
+    """Draw the city for the next start now, so startup can just load it."""
+    asset_cache.save_surface(CITY_CACHE, city_key(), BackgroundManager().bg_surface, "RGB")
+
+assets = {}
+sound_channels = {}  # sound name -> reserved mixer channel
+audio_delay = 0.0  # seconds between starting a sound and hearing it, roughly
+
+def init(backend="surface"):
+    """Open the window and get everything the first frame needs.
+
+    ``backend`` is "surface" to draw into a software surface and scale it
+    on the CPU, or "texture" to draw through SDL's renderer (see
+    TextureCanvas); the surface backend is used if the renderer is not
+    available. Only display and font are initialised here; audio waits
+    for finish_startup(), once the first frame is already on screen.
+    """
+    global screen, window, renderer, game_surface, clock, presenter, assets
+    pygame.display.init()
+    pygame.font.init()
+    if backend == "texture":
+        try:
+            window = Window("Flappy Bird: Custom Edition", (SCREEN_WIDTH, SCREEN_HEIGHT))
+            # accelerated=-1: a GPU renderer if there is one, SDL's software renderer if not
+            renderer = Renderer(window, accelerated=-1)
+        except Exception as e:
+            print(f"Texture backend unavailable, using the surface backend: {e}")
+            if window is not None: window.destroy()
+            window = renderer = None
+    if renderer is not None:
+        game_surface = TextureCanvas((BASE_WIDTH, BASE_HEIGHT))
+        presenter = TexturePresenter()
+    else:
+        screen = pygame.display.set_mode((SCREEN_WIDTH, SCREEN_HEIGHT))
+        game_surface = pygame.Surface((BASE_WIDTH, BASE_HEIGHT))
+        pygame.display.set_caption("Flappy Bird: Custom Edition")
+        presenter = Presenter()
+    clock = pygame.time.Clock()
+    load_fonts()
+    assets = load_assets()
+
+def finish_startup(low_latency=False):
+    init_audio(low_latency)
+    bake_next_city()
 
 # --- DRAWING HELPERS ---
+def lerp(a, b, t):
+    return a + (b - a) * t
+
+def lerp_wrapped(prev, current, t, period):
+    """Interpolate a leftward scroll offset that snaps back to 0 every ``period`` px."""
+    if current > prev: current -= period
+    return prev + (current - prev) * t
+
 def draw_mario_pipe(surface, x, y, width, height, is_top_pipe):
     body_rect = pygame.Rect(x + 4, y, width - 8, height)
     if is_top_pipe:
@@ -153,34 +546,30 @@ class SmoothButton:
         self.target_scale = 1.0
         self.hovered = False
         self.visible = True 
+        self.drawn_key = None
+        self.drawn_rect = None
+        self.dirty_rect = None
         
     def update(self, mouse_pos):
         if not self.visible: return
         self.hovered = self.rect.collidepoint(mouse_pos)
         if self.hovered: self.target_scale = 1.15
         else: self.target_scale = 1.0
-        self.scale += (self.target_scale - self.scale) * 0.2
+        if quality["effects"]: self.scale += (self.target_scale - self.scale) * 0.2
+        else: self.scale = self.target_scale
 
     def draw(self, surface):
         if not self.visible: return
         w = int(self.rect.width * self.scale)
         h = int(self.rect.height * self.scale)
-        scaled_rect = pygame.Rect(0, 0, w, h)
-        scaled_rect.center = self.original_center
-        
-        shadow_rect = scaled_rect.copy()
-        shadow_rect.y += 4
-        pygame.draw.rect(surface, (0, 0, 0, 100), shadow_rect, border_radius=15)
-        
-        color = COLOR_BUTTON_HOVER if self.hovered else COLOR_BUTTON_BG
-        shape_surf = pygame.Surface((w, h), pygame.SRCALPHA)
-        pygame.draw.rect(shape_surf, color, (0, 0, w, h), border_radius=15)
-        surface.blit(shape_surf, scaled_rect.topleft)
-        
-        pygame.draw.rect(surface, (255, 255, 255), scaled_rect, 2, border_radius=15)
-        text_surf = ui_font.render(self.text, True, COLOR_TEXT_DARK)
-        text_rect = text_surf.get_rect(center=scaled_rect.center)
-        surface.blit(text_surf, text_rect)
+        # The pixel size quantizes the hover animation, so a handful of sprites covers it
+        sprite = button_sprites.get((self.text, w, h, self.hovered))
+        cx, cy = self.original_center
+        rect = surface.blit(sprite, (cx - w // 2, cy - h // 2))
+        # Remember what changed since the last frame so only that gets presented
+        key = (w, h, self.hovered)
+        self.dirty_rect = None if key == self.drawn_key else rect.union(self.drawn_rect or rect)
+        self.drawn_key, self.drawn_rect = key, rect
 
     def is_clicked(self, event):
         if not self.visible: return False
@@ -188,281 +577,427 @@ class SmoothButton:
             if self.hovered: return True
         return False
 
-class Bird:
-    def __init__(self, settings):
-        self.x = BIRD_START_X
-        self.y = SCREEN_HEIGHT // 2
-        self.velocity = 0
+class Bird(BirdBody):
+    __slots__ = ("image", "rotations", "hover_timer", "drawn_rect", "dirty_rect",
+                 "prev_center_y", "prev_angle")
+
+    def __init__(self, settings, size=None):
         self.image = assets['bird']
-        self.rect = self.image.get_rect(center=(self.x, self.y))
-        self.angle = 0
-        self.gravity = settings["gravity"]
-        self.flap_strength = settings["flap"]
+        self.rotations = assets['bird_rotations']
+        super().__init__(settings, size or self.image.get_size())
         self.hover_timer = 0
-    
-    def flap(self):
-        self.velocity = self.flap_strength
-        if assets['flap']: assets['flap'].play()
-        
-    def update(self):
-        self.velocity += self.gravity
-        if self.velocity > 15: self.velocity = 15 
-        self.y += self.velocity
-        
-        if self.velocity < 0: self.angle = 20
-        else:
-            if self.angle > -90: self.angle -= 3 
-        self.rect.centery = int(self.y)
+        self.drawn_rect = None
+        self.dirty_rect = pygame.Rect(0, 0, 0, 0)  # Updated in place every frame
+        self.store_previous()
 
-    def update_falling(self):
-        self.velocity += self.gravity
-        if self.velocity > 15: self.velocity = 15
-        self.y += self.velocity
-        self.angle -= 5 
-        if self.angle < -90: self.angle = -90
-        self.rect.centery = int(self.y)
+    def store_previous(self):
+        self.prev_center_y = self.center_y
+        self.prev_angle = self.angle
 
     def update_menu(self):
         self.hover_timer += 0.05
         self.y = (BASE_HEIGHT // 2 - 80) + math.sin(self.hover_timer) * 10
-        self.rect.centery = int(self.y)
+        self.center_y = int(self.y)
         self.angle = 0
 
-    def draw(self):
-        rotated_image = pygame.transform.rotate(self.image, self.angle)
-        new_rect = rotated_image.get_rect(center=self.rect.center)
-        game_surface.blit(rotated_image, new_rect.topleft)
-
-class Pipe:
-    def __init__(self, x, settings):
-        self.x = x
-        self.width = PIPE_WIDTH
-        self.gap = settings["gap"]
-        self.speed = settings["speed"]
-        max_height = BASE_HEIGHT - GROUND_HEIGHT - self.gap - 50
-        min_height = 80
-        self.height = random.randint(min_height, max_height)
-        self.passed = False
+    def draw(self, alpha=1.0):
+        rotated_image, half_w, half_h = self.rotations.get(lerp(self.prev_angle, self.angle, alpha))
+        center_y = round(lerp(self.prev_center_y, self.center_y, alpha))
+        rect = game_surface.blit(rotated_image, (self.x - half_w, center_y - half_h))
+        self.dirty_rect.update(self.drawn_rect or rect)
+        self.dirty_rect.union_ip(rect)
+        self.drawn_rect = rect
 
-    def update(self):
-        self.x -= self.speed
+class Pipe(PipeBody):
+    __slots__ = ("prev_x", "drawn_rect", "dirty_rect", "top_sprite", "bottom_sprite", "bottom_y")
+
+    def __init__(self, x, settings, height):
+        # Updated in place every frame; pipes are recycled, so these last the whole game
+        self.drawn_rect = pygame.Rect(x, 0, PIPE_WIDTH, BASE_HEIGHT - GROUND_HEIGHT)
+        self.dirty_rect = self.drawn_rect.copy()
+        super().__init__(x, settings, height)
+
+    def place(self, x, height):
+        super().place(x, height)
+        self.prev_x = x
+        self.drawn_rect.x = x
+        # The height is fixed until the pipe is recycled, so look the sprites up once
+        self.bottom_y = height + self.gap
+        self.top_sprite = pipe_sprites.get((height, True))
+        self.bottom_sprite = pipe_sprites.get((BASE_HEIGHT - GROUND_HEIGHT - self.bottom_y, False))
 
-    def draw(self):
-        draw_mario_pipe(game_surface, self.x, 0, self.width, self.height, is_top_pipe=True)
-        bottom_y = self.height + self.gap
-        bottom_h = BASE_HEIGHT - GROUND_HEIGHT - bottom_y
-        draw_mario_pipe(game_surface, self.x, bottom_y, self.width, bottom_h, is_top_pipe=False)
+    def draw(self, alpha=1.0):
+        rect = self.drawn_rect
+        dirty = self.dirty_rect
+        dirty.update(rect)
+        rect.x = round(lerp(self.prev_x, self.x, alpha))
+        dirty.union_ip(rect)
+        game_surface.blit(self.top_sprite, rect)
+        game_surface.blit(self.bottom_sprite, (rect.x, self.bottom_y))
+
+class GameWorld(World):
+    """The simulation, populated with drawable birds and pipes."""
+    bird_class = Bird
+    pipe_class = Pipe
+
+    def __init__(self, settings, seed=None):
+        super().__init__(settings, seed, bird_size=assets['bird'].get_size())
+
+def play_sounds(events):
+    for name in events:
+        sound = assets[name]
+        if not sound: continue
+        channel = sound_channels.get(name)
+        if channel: channel.play(sound)
+        else: sound.play()
 
 class BackgroundManager:
-    def __init__(self):
-        self.bg_surface = pygame.Surface((BASE_WIDTH, BASE_HEIGHT))
+    def __init__(self, seed=None, city=None):
         self.x = 0
+        self.prev_x = 0
         self.speed = 0.5
-        self.generate_city() 
+        self.rng = random.Random(seed)
+        if city is None:
+            self.bg_surface = pygame.Surface((BASE_WIDTH, BASE_HEIGHT))
+            self.generate_city()
+        else:
+            self.bg_surface = for_display(city, alpha=False)  # Pre-drawn by bake_next_city()
 
     def generate_city(self):
+        rng = self.rng
         self.bg_surface.fill(COLOR_SKY)
         pygame.draw.circle(self.bg_surface, COLOR_MOON, (300, 100), 40)
         for _ in range(30):
             pygame.draw.circle(self.bg_surface, (255, 255, 255), 
-                             (random.randint(0, BASE_WIDTH), random.randint(0, BASE_HEIGHT // 2)), 1)
+                             (rng.randint(0, BASE_WIDTH), rng.randint(0, BASE_HEIGHT // 2)), 1)
         current_x = 0
         while current_x < BASE_WIDTH:
-            w = random.randint(30, 80)
-            h = random.randint(100, 300)
+            w = rng.randint(30, 80)
+            h = rng.randint(100, 300)
             rect = (current_x, BASE_HEIGHT - GROUND_HEIGHT - h, w, h + GROUND_HEIGHT)
             pygame.draw.rect(self.bg_surface, COLOR_BUILDING, rect)
             for win_y in range(rect[1] + 10, rect[1] + h, 20):
-                if random.random() > 0.5:
-                    win_x = current_x + random.randint(5, w - 10)
+                if rng.random() > 0.5:
+                    win_x = current_x + rng.randint(5, w - 10)
                     pygame.draw.rect(self.bg_surface, (255, 255, 100), (win_x, win_y, 5, 10))
             current_x += w
 
     def update(self):
+        if not quality["scroll_background"]: return
         self.x -= self.speed
         if self.x <= -BASE_WIDTH:
             self.x = 0
 
-    def draw(self):
-        game_surface.blit(self.bg_surface, (self.x, 0))
-        game_surface.blit(self.bg_surface, (self.x + BASE_WIDTH, 0))
+    def draw(self, alpha=1.0):
+        x = lerp_wrapped(self.prev_x, self.x, alpha, BASE_WIDTH)
+        game_surface.blit(self.bg_surface, (x, 0))
+        game_surface.blit(self.bg_surface, (x + BASE_WIDTH, 0))
+
+def render_ground():
+    """The ground with its stripes, one stripe period wider than the screen so it can scroll."""
+    surf = pygame.Surface((BASE_WIDTH + 20, GROUND_HEIGHT))
+    surf.fill(COLOR_GROUND)
+    surf.fill(COLOR_GROUND_TOP, (0, 0, BASE_WIDTH + 20, 5))
+    for i in range(0, BASE_WIDTH + 20, 20):
+        pygame.draw.line(surf, (30, 30, 30), (i, 0), (i - 10, GROUND_HEIGHT), 2)
+    return for_display(surf, alpha=False)
 
 class Ground:
     def __init__(self):
         self.y = BASE_HEIGHT - GROUND_HEIGHT
         self.x = 0
+        self.prev_x = 0
         self.speed = 3
+        self.sprite = render_ground()
 
     def update(self, speed_override=None):
         s = speed_override if speed_override else self.speed
         self.x -= s
         if self.x <= -20: self.x = 0
 
-    def draw(self):
-        pygame.draw.rect(game_surface, COLOR_GROUND, (0, self.y, BASE_WIDTH, GROUND_HEIGHT))
-        pygame.draw.rect(game_surface, COLOR_GROUND_TOP, (0, self.y, BASE_WIDTH, 5))
-        for i in range(0, BASE_WIDTH + 20, 20):
-            pygame.draw.line(game_surface, (30, 30, 30), (self.x + i, self.y), (self.x + i - 10, BASE_HEIGHT), 2)
+    def draw(self, alpha=1.0):
+        x = lerp_wrapped(self.prev_x, self.x, alpha, 20)
+        return game_surface.blit(self.sprite, (round(x), self.y))
 
 # --- HELPER: Draw settings row ---
 def draw_setting_row(surface, label, value, y_pos):
     # Label
-    lbl_surf = small_label_font.render(label, True, (255, 255, 255))
+    lbl_surf = text_sprites.get((small_label_font, label, (255, 255, 255)))
     surface.blit(lbl_surf, (50, y_pos - 10))
     # Value
-    val_surf = ui_font.render(str(round(value, 2)), True, (255, 255, 0))
+    val_surf = text_sprites.get((ui_font, str(round(value, 2)), (255, 255, 0)))
     surface.blit(val_surf, (BASE_WIDTH//2 - 10, y_pos - 10))
 
-# --- MAIN LOOP ---
-def main():
-    global game_surface
-    state = "MENU" # MENU, CUSTOM_MENU, PLAYING, FALLING, GAMEOVER
-    current_difficulty = "MEDIUM"
-    
-    bg_manager = BackgroundManager()
-    ground = Ground()
-    bird = Bird(DIFFICULTY["MEDIUM"]) 
-    pipes = []
-    score = 0
-    dead_sound_played = False
-    
-    # --- MENUS ---
-    # Main Menu (use BASE dimensions for positioning)
-    btn_easy = SmoothButton("Easy", BASE_WIDTH//2, 280, 160, 45, "EASY")
-    btn_med = SmoothButton("Medium", BASE_WIDTH//2, 340, 160, 45, "MEDIUM")
-    btn_hard = SmoothButton("Hard", BASE_WIDTH//2, 400, 160, 45, "HARD")
-    btn_custom = SmoothButton("Custom", BASE_WIDTH//2, 460, 160, 45, "CUSTOM_MENU")
-    main_menu_btns = [btn_easy, btn_med, btn_hard, btn_custom]
-    
-    # Custom Menu
-    btn_spd_dec = SmoothButton("-", 140, 150, 40, 40, "SPD_DEC")
-    btn_spd_inc = SmoothButton("+", 260, 150, 40, 40, "SPD_INC")
-    
-    btn_gap_dec = SmoothButton("-", 140, 250, 40, 40, "GAP_DEC")
-    btn_gap_inc = SmoothButton("+", 260, 250, 40, 40, "GAP_INC")
-    
-    btn_grv_dec = SmoothButton("-", 140, 350, 40, 40, "GRV_DEC")
-    btn_grv_inc = SmoothButton("+", 260, 350, 40, 40, "GRV_INC")
-    
-    btn_play_custom = SmoothButton("Play Custom", BASE_WIDTH//2, 480, 200, 50, "PLAY_CUSTOM")
-    btn_back = SmoothButton("Back", 50, 50, 80, 40, "BACK")
-    
-    custom_menu_btns = [btn_spd_dec, btn_spd_inc, btn_gap_dec, btn_gap_inc, 
-                        btn_grv_dec, btn_grv_inc, btn_play_custom, btn_back]
-
-    # Game Over
-    btn_restart = SmoothButton("Restart", BASE_WIDTH//2, 330, 160, 50, "RESTART")
-    btn_menu = SmoothButton("Menu", BASE_WIDTH//2, 400, 160, 50, "MENU")
-    game_over_btns = [btn_restart, btn_menu]
-
-    running = True 
-    while running:
-        clock.tick(FPS)
-        # Scale mouse position for fullscreen
-        raw_mouse_pos = pygame.mouse.get_pos()
-        mouse_pos = scale_mouse_pos(raw_mouse_pos)
+# --- GAME ---
+class Game:
+    """Menus, the current run and the scenery.
+
+    main() drives it in three phases: ``handle_event`` for input, ``tick``
+    to advance everything that moves by one fixed step of 1 / FPS seconds,
+    and ``draw`` to render into game_surface, interpolating between the last
+    two ticks.
+    """
+    def __init__(self, record_dir=None, autopilot=None):
+        self.state = "MENU" # MENU, CUSTOM_MENU, PLAYING, FALLING, GAMEOVER
+        self.current_difficulty = "MEDIUM"
+        self.running = True
+        self.mouse_pos = (0, 0)
         
-        # --- EVENT HANDLING ---
-        for event in pygame.event.get():
-            if event.type == pygame.QUIT:
-                running = False 
-            
-            # F11 to toggle fullscreen, ESC to exit fullscreen
+        self.bg_manager = BackgroundManager(city=asset_cache.load_surface(CITY_CACHE, city_key()))
+        self.ground = Ground()
+        self.bird = Bird(DIFFICULTY["MEDIUM"]) 
+        self.world = None
+        self.flap_pressed = False
+        self.input_time = 0.0  # estimated arrival of the events being handled
+        self.flap_time = 0.0  # estimated arrival of the pending flap
+        self.flap_applied = None  # flap_time of a flap simulated but not yet presented
+        self.flap_settled = False  # a tick has run since that flap, so every frame shows it
+        self.record_dir = record_dir
+        self.recorder = None
+        self.autopilot = autopilot  # flaps for the player when set; the space bar still works
+        self.drawn_state = None
+        self.drawn_settled = False
+        self.ticked_state = None
+        self.ticks_in_state = 0
+        self.score_rect = None
+        self.score_digits = []  # (digit sprite, position) for the score shown while playing
+        self.drawn_score = None
+
+        # --- MENUS ---
+        # Main Menu (use BASE dimensions for positioning)
+        btn_easy = SmoothButton("Easy", BASE_WIDTH//2, 280, 160, 45, "EASY")
+        btn_med = SmoothButton("Medium", BASE_WIDTH//2, 340, 160, 45, "MEDIUM")
+        btn_hard = SmoothButton("Hard", BASE_WIDTH//2, 400, 160, 45, "HARD")
+        btn_custom = SmoothButton("Custom", BASE_WIDTH//2, 460, 160, 45, "CUSTOM_MENU")
+        self.main_menu_btns = [btn_easy, btn_med, btn_hard, btn_custom]
+        
+        # Custom Menu
+        btn_spd_dec = SmoothButton("-", 140, 150, 40, 40, "SPD_DEC")
+        btn_spd_inc = SmoothButton("+", 260, 150, 40, 40, "SPD_INC")
+        
+        btn_gap_dec = SmoothButton("-", 140, 250, 40, 40, "GAP_DEC")
+        btn_gap_inc = SmoothButton("+", 260, 250, 40, 40, "GAP_INC")
+        
+        btn_grv_dec = SmoothButton("-", 140, 350, 40, 40, "GRV_DEC")
+        btn_grv_inc = SmoothButton("+", 260, 350, 40, 40, "GRV_INC")
+        
+        btn_play_custom = SmoothButton("Play Custom", BASE_WIDTH//2, 480, 200, 50, "PLAY_CUSTOM")
+        btn_back = SmoothButton("Back", 50, 50, 80, 40, "BACK")
+        
+        self.custom_menu_btns = [btn_spd_dec, btn_spd_inc, btn_gap_dec, btn_gap_inc, 
+                                 btn_grv_dec, btn_grv_inc, btn_play_custom, btn_back]
+
+        # Game Over
+        btn_restart = SmoothButton("Restart", BASE_WIDTH//2, 330, 160, 50, "RESTART")
+        btn_menu = SmoothButton("Menu", BASE_WIDTH//2, 400, 160, 50, "MENU")
+        self.game_over_btns = [btn_restart, btn_menu]
+
+    def start_run(self, difficulty, seed=None):
+        self.current_difficulty = difficulty
+        self.state = "PLAYING"
+        settings = DIFFICULTY[difficulty]
+        self.world = GameWorld(settings, seed)
+        self.bird = self.world.bird
+        self.ground.speed = settings["speed"]
+        self.flap_pressed = False
+        if self.record_dir:
+            self.recorder = Recorder(self.world)
+
+    def save_replay(self):
+        """Write the finished run to record_dir, named so replays sort by time."""
+        replay = self.recorder.finish()
+        self.recorder = None
+        name = f"{time.strftime('%Y%m%d-%H%M%S')}-{self.current_difficulty.lower()}-{replay.score}.fbr"
+        os.makedirs(self.record_dir, exist_ok=True)
+        replay.save(os.path.join(self.record_dir, name))
+
+    # --- EVENT HANDLING ---
+    def handle_event(self, event):
+        state = self.state
+        if event.type == pygame.QUIT:
+            self.running = False 
+        
+        # Input can change anything on screen (and the OS may have drawn over us)
+        if event.type in (pygame.KEYDOWN, pygame.MOUSEBUTTONDOWN):
+            presenter.mark_all_dirty()
+        elif event.type in (pygame.VIDEOEXPOSE, pygame.WINDOWEXPOSED):
+            presenter.mode_changed = True
+        
+        # F11 to toggle fullscreen, ESC to exit fullscreen, F3 for the frame profiler
+        if event.type == pygame.KEYDOWN:
+            if event.key == pygame.K_F11:
+                toggle_fullscreen()
+            elif event.key == pygame.K_ESCAPE and is_fullscreen:
+                toggle_fullscreen()
+            elif event.key == pygame.K_F3:
+                profiler.hud_visible = not profiler.hud_visible
+        
+        if state == "MENU":
+            for btn in self.main_menu_btns:
+                if btn.is_clicked(event):
+                    if btn.action_key == "CUSTOM_MENU":
+                        self.state = "CUSTOM_MENU"
+                    else:
+                        self.start_run(btn.action_key)
+        
+        elif state == "CUSTOM_MENU":
+            for btn in self.custom_menu_btns:
+                if btn.is_clicked(event):
+                    cust = DIFFICULTY["CUSTOM"]
+                    k = btn.action_key
+                    
+                    if k == "SPD_INC": cust["speed"] = min(15, cust["speed"] + 1)
+                    elif k == "SPD_DEC": cust["speed"] = max(1, cust["speed"] - 1)
+                    elif k == "GAP_INC": cust["gap"] = min(300, cust["gap"] + 10)
+                    elif k == "GAP_DEC": cust["gap"] = max(80, cust["gap"] - 10)
+                    elif k == "GRV_INC": cust["gravity"] = min(1.5, round(cust["gravity"] + 0.05, 2))
+                    elif k == "GRV_DEC": cust["gravity"] = max(0.1, round(cust["gravity"] - 0.05, 2))
+                    elif k == "PLAY_CUSTOM":
+                        self.start_run("CUSTOM")
+                    elif k == "BACK":
+                        self.state = "MENU"
+
+        elif state == "PLAYING":
             if event.type == pygame.KEYDOWN:
-                if event.key == pygame.K_F11:
-                    toggle_fullscreen()
-                elif event.key == pygame.K_ESCAPE and is_fullscreen:
-                    toggle_fullscreen()
-            
-            if state == "MENU":
-                for btn in main_menu_btns:
-                    if btn.is_clicked(event):
-                        if btn.action_key == "CUSTOM_MENU":
-                            state = "CUSTOM_MENU"
-                        else:
-                            current_difficulty = btn.action_key
-                            state = "PLAYING"
-                            settings = DIFFICULTY[current_difficulty]
-                            bird = Bird(settings)
-                            pipes = [Pipe(BASE_WIDTH + 100, settings)]
-                            ground.speed = settings["speed"]
-                            score = 0
-            
-            elif state == "CUSTOM_MENU":
-                for btn in custom_menu_btns:
-                    if btn.is_clicked(event):
-                        cust = DIFFICULTY["CUSTOM"]
-                        k = btn.action_key
-                        
-                        if k == "SPD_INC": cust["speed"] = min(15, cust["speed"] + 1)
-                        elif k == "SPD_DEC": cust["speed"] = max(1, cust["speed"] - 1)
-                        elif k == "GAP_INC": cust["gap"] = min(300, cust["gap"] + 10)
-                        elif k == "GAP_DEC": cust["gap"] = max(80, cust["gap"] - 10)
-                        elif k == "GRV_INC": cust["gravity"] = min(1.5, round(cust["gravity"] + 0.05, 2))
-                        elif k == "GRV_DEC": cust["gravity"] = max(0.1, round(cust["gravity"] - 0.05, 2))
-                        elif k == "PLAY_CUSTOM":
-                            current_difficulty = "CUSTOM"
-                            state = "PLAYING"
-                            settings = DIFFICULTY["CUSTOM"]
-                            bird = Bird(settings)
-                            pipes = [Pipe(BASE_WIDTH + 100, settings)]
-                            ground.speed = settings["speed"]
-                            score = 0
-                        elif k == "BACK":
-                            state = "MENU"
-
-            elif state == "PLAYING":
-                if event.type == pygame.KEYDOWN:
-                    if event.key == pygame.K_SPACE:
-                        bird.flap()
+                if event.key == pygame.K_SPACE:
+                    # Applied at the start of the next simulation step
+                    if not self.flap_pressed:
+                        self.flap_time = self.input_time
+                    self.flap_pressed = True
+        
+        elif state == "GAMEOVER":
+            for btn in self.game_over_btns:
+                if btn.is_clicked(event):
+                    if btn.action_key == "RESTART":
+                        self.start_run(self.current_difficulty)
+                    elif btn.action_key == "MENU":
+                        self.state = "MENU"
             
-            elif state == "GAMEOVER":
-                for btn in game_over_btns:
-                    if btn.is_clicked(event):
-                        if btn.action_key == "RESTART":
-                            state = "PLAYING"
-                            settings = DIFFICULTY[current_difficulty]
-                            bird = Bird(settings)
-                            pipes = [Pipe(BASE_WIDTH + 100, settings)]
-                            score = 0
-                            dead_sound_played = False
-                        elif btn.action_key == "MENU":
-                            state = "MENU"
-                            dead_sound_played = False
-                
-                if event.type == pygame.KEYDOWN and event.key == pygame.K_SPACE:
-                    state = "PLAYING"
-                    settings = DIFFICULTY[current_difficulty]
-                    bird = Bird(settings)
-                    pipes = [Pipe(BASE_WIDTH + 100, settings)]
-                    score = 0
-                    dead_sound_played = False
-
-        if not running: break
-
-        # --- DRAWING (render to game_surface first) ---
-        bg_manager.draw()
+            if event.type == pygame.KEYDOWN and event.key == pygame.K_SPACE:
+                self.start_run(self.current_difficulty)
+
+    # --- SIMULATION ---
+    def store_previous(self):
+        """Remember where everything is so draw() can interpolate from here."""
+        self.bg_manager.prev_x = self.bg_manager.x
+        self.ground.prev_x = self.ground.x
+        self.bird.store_previous()
+        if self.world:
+            for pipe in self.world.pipes:
+                pipe.prev_x = pipe.x
+
+    def presented_flap(self, alpha):
+        """Hand over the ``flap_time`` of a flap that a frame drawn at ``alpha`` shows, once.
+
+        Drawn at alpha 0 the frame is still the state before the last tick,
+        so a flap made on that tick does not show until later.
+        """
+        if self.flap_applied is None or (alpha <= 0.0 and not self.flap_settled):
+            return None
+        flap_time = self.flap_applied
+        self.flap_applied = None
+        return flap_time
+
+    def tick(self):
+        self.store_previous()
+        if self.flap_applied is not None:
+            self.flap_settled = True
+        state = self.state
         
         if state == "MENU":
-            bg_manager.update()
-            ground.update(speed_override=2)
-            bird.update_menu()
-            ground.draw()
-            bird.draw()
+            self.bg_manager.update()
+            self.ground.update(speed_override=2)
+            self.bird.update_menu()
+            for btn in self.main_menu_btns:
+                btn.update(self.mouse_pos)
+
+        elif state == "CUSTOM_MENU":
+            for btn in self.custom_menu_btns:
+                btn.update(self.mouse_pos)
+
+        elif state == "PLAYING":
+            self.bg_manager.update()
+            pressed = self.flap_pressed
+            flapped = pressed or (self.autopilot is not None and self.autopilot.decide(self.world))
+            if self.recorder: self.recorder.record(flapped)
+            self.world.step(flapped)
+            self.flap_pressed = False
+            self.ground.update()
+            play_sounds(self.world.events)
+            if pressed:
+                self.flap_applied = self.flap_time
+                self.flap_settled = False
+                if assets['flap']:
+                    profiler.record_latency("sound", time.perf_counter() - self.flap_time + audio_delay)
+            self.state = self.world.state
+            if self.recorder and self.state != "PLAYING":
+                self.save_replay()
+
+        elif state == "FALLING":
+            self.world.step()
+            self.state = self.world.state
+
+        elif state == "GAMEOVER":
+            for btn in self.game_over_btns:
+                btn.visible = True
+                btn.update(self.mouse_pos)
+            if self.autopilot and self.ticks_in_state >= AUTOPILOT_RESTART:
+                self.start_run(self.current_difficulty)
+
+        if self.state == self.ticked_state: self.ticks_in_state += 1
+        else: self.ticks_in_state = 0
+        self.ticked_state = self.state
+
+    # --- DRAWING (render to game_surface first) ---
+    def layout_score(self, score):
+        """Place the score as one cached sprite per digit, so no score is ever rendered anew."""
+        self.drawn_score = score
+        self.score_digits.clear()
+        x = BASE_WIDTH//2 - 10
+        for char in str(score):
+            digit = text_sprites.get((score_font, char, (255, 255, 255)))
+            self.score_digits.append((digit, (x, 50)))
+            x += digit.get_width()
+        s_rect = pygame.Rect(BASE_WIDTH//2 - 10, 50, x - (BASE_WIDTH//2 - 10), score_font.get_height())
+        presenter.mark_dirty(s_rect.union(self.score_rect or s_rect))
+        self.score_rect = s_rect
+
+    def draw(self, alpha=1.0):
+        """Render the current state; ``alpha`` (0..1) is how far we are past the previous tick."""
+        state = self.state
+        bird = self.bird
+        ground = self.ground
+        # Scrolling states repaint everything; the rest only present what moved,
+        # once whatever was interpolating into the new state has come to rest
+        settled = self.ticks_in_state >= 2
+        scrolling = quality["scroll_background"] and state in ("MENU", "PLAYING")
+        if state != self.drawn_state or not (settled and self.drawn_settled) or scrolling:
+            presenter.mark_all_dirty()
+        self.drawn_state = state
+        self.drawn_settled = settled
+        self.bg_manager.draw(alpha)
+        profiler.lap("background")
+        
+        if state == "MENU":
+            presenter.mark_dirty(ground.draw(alpha))
+            bird.draw(alpha)
+            presenter.mark_dirty(bird.dirty_rect)
+            profiler.lap("sprites")
             
-            t_surf = title_font.render("FLAPPY BIRD", True, (255, 255, 255))
+            t_surf = text_sprites.get((title_font, "FLAPPY BIRD", (255, 255, 255)))
             t_rect = t_surf.get_rect(center=(BASE_WIDTH//2, 100))
             game_surface.blit(t_surf, t_rect)
             
-            for btn in main_menu_btns:
-                btn.update(mouse_pos)
+            for btn in self.main_menu_btns:
                 btn.draw(game_surface)
+                presenter.mark_dirty(btn.dirty_rect)
 
         elif state == "CUSTOM_MENU":
             # Static background for custom menu
-            ground.draw()
+            ground.draw(alpha)
+            profiler.lap("sprites")
             
-            t_surf = ui_font.render("CUSTOM SETTINGS", True, (255, 255, 255))
+            t_surf = text_sprites.get((ui_font, "CUSTOM SETTINGS", (255, 255, 255)))
             game_surface.blit(t_surf, (BASE_WIDTH//2 - 100, 30))
             
             # Draw Values and Labels
@@ -471,84 +1006,284 @@ def main():
             draw_setting_row(game_surface, "Pipe Gap", cust["gap"], 250)
             draw_setting_row(game_surface, "Gravity", cust["gravity"], 350)
 
-            for btn in custom_menu_btns:
-                btn.update(mouse_pos)
+            for btn in self.custom_menu_btns:
                 btn.draw(game_surface)
+                presenter.mark_dirty(btn.dirty_rect)
 
         elif state == "PLAYING":
-            bg_manager.update()
-            bird.update()
-            ground.update()
-            
-            if pipes[-1].x < BASE_WIDTH - 200:
-                pipes.append(Pipe(BASE_WIDTH, DIFFICULTY[current_difficulty]))
-
-            for pipe in pipes:
-                pipe.update()
-                pipe.draw()
-                
-                hitbox = bird.rect.inflate(-HITBOX_SHRINK_X, -HITBOX_SHRINK_Y)
-                if hitbox.colliderect(pygame.Rect(pipe.x + 4, 0, pipe.width - 8, pipe.height)) or \
-                   hitbox.colliderect(pygame.Rect(pipe.x + 4, pipe.height + pipe.gap, pipe.width - 8, BASE_HEIGHT)):
-                    state = "FALLING"
-                    if assets['hit']: assets['hit'].play()
-
-                if not pipe.passed and pipe.x < bird.x:
-                    score += 1
-                    pipe.passed = True
-                    if assets['point']: assets['point'].play()
-
-            if bird.y >= BASE_HEIGHT - GROUND_HEIGHT - 10:
-                state = "GAMEOVER"
-                if assets['hit']: assets['hit'].play()
-
-            if bird.y < 0: bird.y = 0
-            if pipes[0].x < -100: pipes.pop(0)
+            for pipe in self.world.pipes:
+                pipe.draw(alpha)
+                presenter.mark_dirty(pipe.dirty_rect)
                 
-            bird.draw()
-            ground.draw()
+            bird.draw(alpha)
+            presenter.mark_dirty(bird.dirty_rect)
+            presenter.mark_dirty(ground.draw(alpha))
+            profiler.lap("sprites")
             
-            s_surf = score_font.render(str(score), True, (255, 255, 255))
-            game_surface.blit(s_surf, (BASE_WIDTH//2 - 10, 50))
+            # Only a new score needs laying out or presenting; whatever moves under it is presented anyway
+            if self.world.score != self.drawn_score:
+                self.layout_score(self.world.score)
+            for digit, pos in self.score_digits:
+                game_surface.blit(digit, pos)
             
         elif state == "FALLING":
-            bird.update_falling()
-            for pipe in pipes: pipe.draw()
-            ground.draw()
-            bird.draw()
-            if bird.y >= BASE_HEIGHT - GROUND_HEIGHT - 10:
-                state = "GAMEOVER"
+            for pipe in self.world.pipes: pipe.draw(alpha)
+            ground.draw(alpha)
+            bird.draw(alpha)
+            presenter.mark_dirty(bird.dirty_rect)
+            profiler.lap("sprites")
             
         elif state == "GAMEOVER":
-            for pipe in pipes: pipe.draw()
-            ground.draw()
-            bird.draw()
+            for pipe in self.world.pipes: pipe.draw(alpha)
+            ground.draw(alpha)
+            bird.draw(alpha)
+            profiler.lap("sprites")
             
-            overlay = pygame.Surface((BASE_WIDTH, BASE_HEIGHT), pygame.SRCALPHA)
-            overlay.fill((0, 0, 0, 100))
-            game_surface.blit(overlay, (0,0))
+            if quality["effects"]:
+                overlay = overlay_sprites.get((BASE_WIDTH, BASE_HEIGHT, (0, 0, 0, 100)))
+                game_surface.blit(overlay, (0,0))
             
-            over_surf = title_font.render("GAME OVER", True, (255, 80, 80))
+            over_surf = text_sprites.get((title_font, "GAME OVER", (255, 80, 80)))
             over_rect = over_surf.get_rect(center=(BASE_WIDTH//2, 150))
             game_surface.blit(over_surf, over_rect)
             
-            score_surf = score_font.render(f"Score: {score}", True, (255, 255, 255))
+            score_surf = text_sprites.get((score_font, f"Score: {self.world.score}", (255, 255, 255)))
             score_rect = score_surf.get_rect(center=(BASE_WIDTH//2, 220))
             game_surface.blit(score_surf, score_rect)
             
-            for btn in game_over_btns:
-                btn.visible = True
-                btn.update(mouse_pos)
+            for btn in self.game_over_btns:
                 btn.draw(game_surface)
+                presenter.mark_dirty(btn.dirty_rect)
+
+        profiler.lap("ui")
+
+# --- MAIN LOOP ---
+def run_steps(game, accumulator, step, steps=0):
+    """Tick through the time in ``accumulator``; return the time left over and the steps run.
+
+    Catches up on at most MAX_CATCHUP_STEPS steps in all (counting the
+    ``steps`` already run this frame) and never spirals: if it is still
+    behind after that, the backlog is dropped and the game slows down.
+    """
+    while accumulator >= step and steps < MAX_CATCHUP_STEPS:
+        game.tick()
+        accumulator -= step
+        steps += 1
+    if accumulator >= step:
+        accumulator = 0.0
+    return accumulator, steps
+
+class SimulationThread:
+    """Runs a frame's simulation steps on a worker thread while the frame is presented.
+
+    The main thread draws frame N, calls ``start`` and presents; meanwhile
+    the worker ticks the game through the time up to that moment, spawning
+    pipes, scoring and triggering sounds as ``Game.tick`` always does.
+    ``finish`` waits for those ticks at the top of frame N+1, before any
+    event is handled or anything is drawn, so the game is only ever touched
+    by one thread at a time and needs no locks or copies. Scaling and
+    flipping release the GIL, so on a multi-core machine the two overlap.
+
+    What is drawn is the state as of the previous frame's ``start``, so
+    input shows on screen one frame later than in the serial loop.
+    """
+    def __init__(self, game, step):
+        self.game = game
+        self.step = step
+        self.accumulator = 0.0
+        self.last_time = time.perf_counter()
+        self.executor = ThreadPoolExecutor(1, thread_name_prefix="simulation")
+        self.pending = None
+
+    def start(self, elapsed=None):
+        """Begin ticking through the time since the last start (or ``elapsed`` seconds)."""
+        now = time.perf_counter()
+        self.accumulator += now - self.last_time if elapsed is None else elapsed
+        self.last_time = now
+        self.pending = self.executor.submit(run_steps, self.game, self.accumulator, self.step)
+
+    def finish(self):
+        """Wait for the ticks begun by ``start``; return how many steps ran."""
+        if self.pending is None:
+            return 0
+        self.accumulator, steps = self.pending.result()
+        self.pending = None
+        return steps
+
+    def close(self):
+        self.finish()
+        self.executor.shutdown()
+
+def wait_for_step(deadline, checked):
+    """Sleep until ``deadline``, but return as soon as a key or button is pressed.
+
+    Input is looked at every millisecond rather than once a frame, so a
+    press is handled almost as soon as it arrives. Returns the last time
+    there was none, given it was last seen missing at ``checked``.
+    """
+    while True:
+        now = time.perf_counter()
+        if now >= deadline or pygame.event.peek(WAKE_EVENTS):
+            return checked
+        checked = now
+        pygame.time.wait(1)
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Flappy Bird: Custom Edition")
+    parser.add_argument("--fps", type=int, default=FPS,
+                        help=f"render rate cap, 0 for uncapped; physics always runs at {FPS} Hz")
+    parser.add_argument("--record", metavar="DIR",
+                        help="save a replay of every finished run into DIR")
+    parser.add_argument("--trace", metavar="PATH",
+                        help="on exit, write per-phase frame timings to PATH (.json Chrome trace or .csv)")
+    parser.add_argument("--capture", metavar="PATH",
+                        help="record every frame to PATH: a .y4m or .raw video, or else a directory of PNGs; "
+                             "needs NumPy and a fixed frame rate (not --fps 0)")
+    parser.add_argument("--backend", choices=("surface", "texture"), default="surface",
+                        help="draw into a surface scaled on the CPU, or through SDL's renderer "
+                             "with sprites as textures (GPU if available, else software)")
+    parser.add_argument("--quality", default="auto", choices=["auto"] + [str(i) for i in range(len(QUALITY_LEVELS))],
+                        help="adapt the quality level to keep the frame rate (default), or fix it; "
+                             "0 is full quality, " + ", ".join(f"{i} {q['name']}" for i, q in enumerate(QUALITY_LEVELS) if i))
+    parser.add_argument("--serve", metavar="[HOST:]PORT",
+                        help="stream the game to spectators (python spectate.py HOST:PORT); "
+                             "HOST defaults to 127.0.0.1, use 0.0.0.0 to accept other machines")
+    parser.add_argument("--low-latency", action="store_true",
+                        help="read input right before each step and use a small audio buffer; "
+                             "frames follow the physics rate, show each step as soon as it has run, "
+                             "and --fps is ignored")
+    parser.add_argument("--pipelined", action="store_true",
+                        help="simulate the next frame on a second thread while this one is presented; "
+                             "input shows a frame later")
+    parser.add_argument("--autopilot", metavar="DIFFICULTY", choices=("EASY", "MEDIUM", "HARD", "CUSTOM"),
+                        help="let the lookahead autopilot play DIFFICULTY, starting over after every crash; "
+                             "F3 shows its planning time")
+    args = parser.parse_args(argv)
+    if args.capture and args.backend == "texture":
+        parser.error("--capture reads game_surface, which the texture backend does not draw into")
+    if args.capture and not args.fps and not args.low_latency:
+        parser.error("--capture writes a fixed frame rate, which --fps 0 does not keep")
+    if args.pipelined and args.low_latency:
+        parser.error("--pipelined draws a frame behind the simulation, which --low-latency is meant to avoid")
+
+    init(args.backend)
+    global profiler
+    # Uncapped frames are still held to the physics rate
+    budget = 1 / (FPS if args.low_latency or not args.fps else args.fps)
+    if args.trace:
+        profiler = FrameProfiler(trace_frames=TRACE_FRAMES)
+    profiler.budget = budget
+    governor = None
+    if args.quality == "auto":
+        governor = QualityGovernor(budget)
+        governor.skip(idle_quality_levels())
+    set_quality(governor.level if governor else int(args.quality))
+    capture = None
+    if args.capture:
+        from capture import FrameCapture  # Needs NumPy, which nothing else does
+        capture = FrameCapture(args.capture, game_surface,
+                               fps=FPS if args.low_latency else args.fps)
+    server = None
+    if args.serve:
+        server = SpectatorServer(*parse_address(args.serve))
+        print(f"Serving spectators on {server.address[0]}:{server.address[1]}")
+
+    autopilot = Autopilot() if args.autopilot else None
+    game = Game(record_dir=args.record, autopilot=autopilot)
+    if autopilot:
+        game.start_run(args.autopilot)
+    step = 1 / FPS
+    accumulator = 0.0
+    last_time = polled = time.perf_counter()
+    started = False
+    pipeline = SimulationThread(game, step) if args.pipelined else None
+
+    while game.running:
+        profiler.begin_frame()
+        if args.low_latency:
+            # Wake when the next step is due, or early if there is input to act on
+            polled = wait_for_step(last_time + step - accumulator, polled)
+        else:
+            clock.tick(args.fps)
+        profiler.lap("wait")
+        now = time.perf_counter()
+        if pipeline:
+            # Normally done already: these ticks ran while the last frame was presented
+            steps = pipeline.finish()
+            accumulator = pipeline.accumulator
+            profiler.lap("update")
+        else:
+            accumulator += now - last_time
+            last_time = now
+        # Scale mouse position for fullscreen
+        game.mouse_pos = scale_mouse_pos(pygame.mouse.get_pos())
+
+        # pygame events carry no timestamp; anything in the queue arrived
+        # since the last look, so count it from halfway in between
+        game.input_time = (polled + now) / 2
+        for event in pygame.event.get():
+            game.handle_event(event)
+        polled = time.perf_counter()
+        profiler.lap("events")
+
+        if not game.running: break
+
+        if not pipeline:
+            # Fixed-step simulation: catch up on elapsed time, but never spiral
+            steps = 0
+            if args.low_latency and game.flap_pressed and 0.0 <= accumulator < step:
+                # Run the step with the flap now and take its time out of the next
+                # one; at most one step is ever borrowed, so the pace is unchanged
+                game.tick()
+                accumulator -= step
+                steps = 1
+            accumulator, steps = run_steps(game, accumulator, step, steps)
+            profiler.lap("update")
+        if server and steps:
+            server.publish(game.state, game.world)
+            profiler.lap("publish")
+        # Low-latency frames come once per step, so they show the newest one
+        # as it is; interpolating would show the step before it
+        alpha = 1.0 if args.low_latency else max(accumulator, 0.0) / step
+        flap_applied = game.presented_flap(alpha)
+
+        game.draw(alpha)
+        if capture:
+            capture.add(game_surface)  # Before the HUD goes on
+            profiler.lap("capture")
+        if profiler.hud_visible:
+            if autopilot:
+                p50_ms, p99_ms, _, _, max_nodes = autopilot.summary()
+                profiler.status["autopilot"] = f"plan {p50_ms:.2f}/{p99_ms:.2f} ms, {max_nodes} nodes"
+            presenter.mark_dirty(profiler.draw_hud(game_surface, hud_font))
+            profiler.lap("hud")
+        if pipeline:
+            pipeline.start()
+
+        if governor and presenter.mode_changed and governor.skip(idle_quality_levels()):
+            set_quality(governor.level)  # Back from a level this display mode makes pointless
 
         # Scale game_surface to screen (with letterboxing for fullscreen)
-        scale, offset_x, offset_y = get_scale_and_offset()
-        screen.fill((0, 0, 0))  # Black letterbox bars
-        scaled_surface = pygame.transform.scale(game_surface, (int(BASE_WIDTH * scale), int(BASE_HEIGHT * scale)))
-        screen.blit(scaled_surface, (offset_x, offset_y))
-        pygame.display.flip()
+        presenter.present()
+        if governor and governor.frame(time.perf_counter() - now):
+            set_quality(governor.level)
+        if flap_applied is not None:
+            profiler.record_latency("present", time.perf_counter() - flap_applied)
+        profiler.end_frame()
+        if not started:
+            finish_startup(args.low_latency)
+            started = True
 
+    if pipeline:
+        pipeline.close()
+    if args.trace:
+        profiler.export(args.trace)
+    if server:
+        server.close()
+    if capture:
+        capture.close()
+        print(f"Captured {capture.frames} frames to {args.capture}, dropped {capture.dropped}")
     pygame.quit()
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()
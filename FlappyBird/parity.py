@@ -0,0 +1,274 @@
+"""Headless parity checks: the fast paths against plain frame-by-frame rules.
+
+    python parity.py rules --runs 500
+    python parity.py fast-forward --runs 2500
+    python parity.py time-of-impact --runs 1000
+
+``rules`` plays seeded runs through ``simulation.World``
+and through ``OriginalRules``, the PLAYING / FALLING / GAMEOVER part of the
+original game loop with its pygame.Rect hitboxes, and compares the bird,
+every pipe, the score and the state after every frame. Settings are the
+presets plus random custom ones across the whole range the custom menu
+allows.
+
+``fast-forward`` records the flap frames of such a run, then plays them
+again twice: once calling ``collision.fast_forward`` between flaps in
+chunks of random length, once with ``World.step`` alone. Both worlds'
+snapshots, rewards and done flags have to agree after every chunk, also
+while the bird falls and after it has landed.
+
+``time-of-impact`` asks ``collision.time_of_impact`` on every frame of such
+a run, before the bird crashes, and checks the answer against a copy of the
+world stepped without flapping. The copy only runs as far as a pipe spawned
+meanwhile could not yet reach the bird, as the prediction leaves those out.
+
+The exit status is 1 if any run differs; the first difference of each run
+is printed.
+"""
+import argparse
+import random
+import sys
+
+import pygame
+
+from collision import fast_forward, overlap, time_of_impact
+from simulation import (BASE_HEIGHT, BASE_WIDTH, BIRD_SIZE, BIRD_START_X, DIFFICULTY, GROUND_HEIGHT,
+                        HITBOX_SHRINK_X, HITBOX_SHRINK_Y, PIPE_SPAWN_X, PIPE_WIDTH, World)
+
+PRESETS = ("EASY", "MEDIUM", "HARD")
+BIRD_SIZES = (BIRD_SIZE, (50, 36))  # the sprite's own shape, and the fallback when flappy.png is missing
+MAX_FRAMES = 3000
+AFTER_CRASH = 10  # frames kept stepping once a run is over, which must change nothing
+MAX_CHUNK = 200  # longest fast_forward call, in frames
+
+
+class OriginalRules:
+    """The game loop's rules before they moved into ``World``, kept as they were."""
+
+    def __init__(self, settings, seed, bird_size=BIRD_SIZE):
+        self.settings = settings
+        self.rng = random.Random(seed)  # the original drew heights from the global random module
+        self.x = BIRD_START_X
+        self.y = BASE_HEIGHT // 2
+        self.velocity = 0
+        self.angle = 0
+        self.rect = pygame.Rect((0, 0), bird_size)
+        self.rect.center = (self.x, self.y)
+        self.pipes = [self.new_pipe(BASE_WIDTH + 100)]
+        self.score = 0
+        self.state = "PLAYING"
+
+    def new_pipe(self, x):
+        gap = self.settings["gap"]
+        height = self.rng.randint(80, BASE_HEIGHT - GROUND_HEIGHT - gap - 50)
+        return {"x": x, "height": height, "passed": False}
+
+    def step(self, flap):
+        settings = self.settings
+        if self.state == "PLAYING":
+            if flap:
+                self.velocity = settings["flap"]
+            self.velocity += settings["gravity"]
+            if self.velocity > 15: self.velocity = 15
+            self.y += self.velocity
+            if self.velocity < 0: self.angle = 20
+            else:
+                if self.angle > -90: self.angle -= 3
+            self.rect.centery = int(self.y)
+
+            pipes = self.pipes
+            if pipes[-1]["x"] < BASE_WIDTH - 200:
+                pipes.append(self.new_pipe(BASE_WIDTH))
+            for pipe in pipes:
+                pipe["x"] -= settings["speed"]
+                hitbox = self.rect.inflate(-HITBOX_SHRINK_X, -HITBOX_SHRINK_Y)
+                if hitbox.colliderect(pygame.Rect(pipe["x"] + 4, 0, PIPE_WIDTH - 8, pipe["height"])) or \
+                   hitbox.colliderect(pygame.Rect(pipe["x"] + 4, pipe["height"] + settings["gap"],
+                                                  PIPE_WIDTH - 8, BASE_HEIGHT)):
+                    self.state = "FALLING"
+                if not pipe["passed"] and pipe["x"] < self.x:
+                    self.score += 1
+                    pipe["passed"] = True
+            if self.y >= BASE_HEIGHT - GROUND_HEIGHT - 10:
+                self.state = "GAMEOVER"
+            if self.y < 0: self.y = 0
+            if pipes[0]["x"] < -100: pipes.pop(0)
+
+        elif self.state == "FALLING":
+            self.velocity += settings["gravity"]
+            if self.velocity > 15: self.velocity = 15
+            self.y += self.velocity
+            self.angle -= 5
+            if self.angle < -90: self.angle = -90
+            self.rect.centery = int(self.y)
+            if self.y >= BASE_HEIGHT - GROUND_HEIGHT - 10:
+                self.state = "GAMEOVER"
+
+    def observe(self):
+        return (self.state, self.score, self.y, self.velocity, self.angle, self.rect.centery,
+                [(p["x"], p["height"], p["passed"]) for p in self.pipes])
+
+
+def observe_world(world):
+    bird = world.bird
+    return (world.state, world.score, bird.y, bird.velocity, bird.angle, bird.center_y,
+            [(p.x, p.height, p.passed) for p in world.pipes])
+
+
+def random_settings(rng):
+    """A preset, or custom settings anywhere in the custom menu's range."""
+    if rng.random() < 0.5:
+        return dict(DIFFICULTY[rng.choice(PRESETS)])
+    return {"gap": rng.randrange(80, 301, 10), "speed": rng.randint(1, 15),
+            "gravity": round(rng.randrange(2, 31) * 0.05, 2), "flap": DIFFICULTY["CUSTOM"]["flap"]}
+
+
+def noisy_policy(rng, margin, noise):
+    """Aim for the lower lip of the next gap, but get it wrong now and then,
+    so runs pass pipes, graze them and crash into them."""
+    def policy(observation):
+        y, velocity, _, height, gap = observation
+        flap = gap and y + 15 > height + gap - margin and velocity >= 0
+        return flap != (rng.random() < noise)
+    return policy
+
+
+def check_rules(run):
+    """Play run number ``run`` both ways; return the first difference, or None."""
+    rng = random.Random(run)
+    settings = random_settings(rng)
+    size = rng.choice(BIRD_SIZES)
+    policy = noisy_policy(rng, rng.uniform(5, 60), rng.uniform(0.0, 0.05))
+    world = World(settings, run, bird_size=size)
+    original = OriginalRules(settings, run, size)
+    over = 0
+    for frame in range(MAX_FRAMES):
+        flap = policy(world.observe())
+        world.step(flap)
+        original.step(flap)
+        expected = original.observe()
+        actual = observe_world(world)
+        if actual != expected:
+            return f"settings {settings}, bird {size}, frame {frame}: World {actual} != original {expected}"
+        if original.state != "PLAYING":
+            over += 1
+            if over > AFTER_CRASH:
+                break
+    return None
+
+
+def step_frames(world, frames):
+    """What ``fast_forward`` promises, one ``step(False)`` at a time."""
+    end = world.frame + frames
+    reward = 0
+    while world.frame < end and world.state != "GAMEOVER":
+        playing = world.state == "PLAYING"
+        _, gained, done = world.step(False)
+        reward += gained
+        if done and playing:
+            break
+    return world.observe(), reward, world.state != "PLAYING"
+
+
+def check_fast_forward(run):
+    """Play run number ``run`` fast-forwarded and stepped; return the first difference, or None."""
+    rng = random.Random(run)
+    settings = random_settings(rng)
+    size = rng.choice(BIRD_SIZES)
+    policy = noisy_policy(rng, rng.uniform(5, 60), rng.uniform(0.0, 0.05))
+    world = World(settings, run, bird_size=size)
+    flaps = []
+    while world.state == "PLAYING" and world.frame < MAX_FRAMES:
+        if policy(world.observe()):
+            flaps.append(world.frame)
+            world.step(True)
+        else:
+            world.step(False)
+
+    forwarded = World(settings, run, bird_size=size)
+    stepped = World(settings, run, bird_size=size)
+    def compare(what, actual, expected):
+        if actual != expected or forwarded.snapshot() != stepped.snapshot():
+            return (f"settings {settings}, bird {size}, {what} at frame {stepped.frame}: "
+                    f"fast_forward {actual} {forwarded.snapshot()} != "
+                    f"step {expected} {stepped.snapshot()}")
+        return None
+    # Coast up to each flap in chunks, then keep going until the bird has
+    # landed, and a few calls past that
+    for flap in flaps + [None] * AFTER_CRASH:
+        while flap is None or forwarded.frame < flap:
+            frames = rng.randint(1, MAX_CHUNK)
+            if flap is not None:
+                frames = min(frames, flap - forwarded.frame)
+            difference = compare(f"fast_forward({frames})",
+                                 fast_forward(forwarded, frames), step_frames(stepped, frames))
+            if difference:
+                return difference
+            if flap is None:
+                break
+        if flap is not None:
+            difference = compare("flap", forwarded.step(True), stepped.step(True))
+            if difference:
+                return difference
+    return None
+
+
+def steps_to_impact(world, frames):
+    """What ``time_of_impact`` promises, found by stepping ``world`` and rolling it back."""
+    snapshot = world.snapshot()
+    hit = None
+    for k in range(1, frames + 1):
+        if world.step(False)[2]:
+            hit = k
+            break
+    world.restore(snapshot)
+    return hit
+
+
+def check_time_of_impact(run):
+    """Predict the crash on every frame of run number ``run``; return the first miss, or None."""
+    rng = random.Random(run)
+    settings = random_settings(rng)
+    size = rng.choice(BIRD_SIZES)
+    policy = noisy_policy(rng, rng.uniform(5, 60), rng.uniform(0.0, 0.05))
+    world = World(settings, run, bird_size=size)
+    left, _, right, _ = world.bird.hitbox()
+    # A pipe spawned on the next step is the first that time_of_impact cannot know about
+    frames = overlap(PIPE_SPAWN_X, settings["speed"], left, right, PIPE_WIDTH)[0] - 1
+    while world.state == "PLAYING" and world.frame < MAX_FRAMES:
+        predicted = time_of_impact(world, frames)
+        expected = steps_to_impact(world, frames)
+        if predicted != expected:
+            return (f"settings {settings}, bird {size}, frame {world.frame}: "
+                    f"time_of_impact {predicted} != step {expected}")
+        world.step(policy(world.observe()))
+    return None
+
+
+CHECKS = {"rules": check_rules, "fast-forward": check_fast_forward, "time-of-impact": check_time_of_impact}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    sub = parser.add_subparsers(dest="command", required=True)
+    rules = sub.add_parser("rules", help="compare World with the original game loop's rules")
+    rules.add_argument("--runs", type=int, default=500)
+    forward = sub.add_parser("fast-forward", help="compare collision.fast_forward with stepping")
+    forward.add_argument("--runs", type=int, default=2500)
+    impact = sub.add_parser("time-of-impact", help="compare collision.time_of_impact with stepping")
+    impact.add_argument("--runs", type=int, default=1000)
+    args = parser.parse_args(argv)
+
+    check = CHECKS[args.command]
+    failures = 0
+    for run in range(args.runs):
+        difference = check(run)
+        if difference:
+            failures += 1
+            print(f"run {run}: {difference}")
+    print(f"{args.command}: {args.runs - failures} of {args.runs} runs identical")
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
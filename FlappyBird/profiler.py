@@ -0,0 +1,161 @@
+"""Per-phase frame timing with an on-screen HUD and trace export.
+
+The main loop calls ``begin_frame()`` once per frame and ``lap(name)`` at
+the end of each phase, so every phase costs a single ``perf_counter`` call.
+The last ``window`` frames are kept for rolling p50/p99 figures and a
+frame-time histogram. Input-to-output latencies reported with
+``record_latency`` are shown under the phases. When tracing is enabled every frame's phases are also
+kept (up to ``trace_frames``) and can be written out as Chrome trace JSON,
+which loads in chrome://tracing or Perfetto, or as CSV.
+"""
+import csv
+import json
+import time
+from collections import deque
+
+import pygame
+
+from simulation import FPS
+from stats import percentile
+
+HUD_REFRESH = 15  # frames between HUD redraws; the numbers are rolling anyway
+HUD_WIDTH = 170
+HISTOGRAM_HEIGHT = 40
+HISTOGRAM_MS = 34  # one bucket per millisecond, the last one collects the overflow
+LATENCY_SAMPLES = 100  # recent samples kept per latency; they come per press, not per frame
+
+
+class FrameProfiler:
+    def __init__(self, window=240, trace_frames=0, budget=1 / FPS):
+        self.window = window
+        self.budget = budget  # seconds a frame may take; slower ones show red in the histogram
+        self.phases = {}  # phase name -> recent durations in seconds, in first-seen order
+        self.frame_times = deque(maxlen=window)
+        self.trace = deque(maxlen=trace_frames) if trace_frames else None
+        self.latencies = {}  # name -> recent input-to-output latencies in seconds
+        self.hud_visible = False
+        self.status = {}  # name -> line of extra state shown at the top of the HUD
+        self._laps = []
+        self._frame_start = self._last = time.perf_counter()
+        self._hud_surface = None
+        self._hud_age = HUD_REFRESH
+
+    # --- Timing ---
+    def begin_frame(self):
+        self._frame_start = self._last = time.perf_counter()
+
+    def lap(self, phase):
+        """Close the phase that started at the previous lap (or frame start)."""
+        now = time.perf_counter()
+        self._laps.append((phase, self._last, now))
+        self._last = now
+
+    def end_frame(self):
+        laps = self._laps
+        phases = self.phases
+        for phase, start, end in laps:
+            samples = phases.get(phase)
+            if samples is None:
+                samples = phases[phase] = deque(maxlen=self.window)
+            samples.append(end - start)
+        self.frame_times.append(self._last - self._frame_start)
+        if self.trace is not None:
+            self.trace.append((self._frame_start, self._last, laps))
+            self._laps = []
+        else:
+            laps.clear()
+
+    def summary(self):
+        """Return ``[(name, p50_ms, p99_ms)]`` for the whole frame and each phase."""
+        rows = []
+        for name, samples in [("frame", self.frame_times)] + list(self.phases.items()):
+            values = sorted(samples)
+            rows.append((name, percentile(values, 0.5) * 1000, percentile(values, 0.99) * 1000))
+        return rows
+
+    # --- Latency ---
+    def record_latency(self, name, seconds):
+        samples = self.latencies.get(name)
+        if samples is None:
+            samples = self.latencies[name] = deque(maxlen=LATENCY_SAMPLES)
+        samples.append(seconds)
+
+    def latency_summary(self):
+        """Return ``[(name, p50_ms, p99_ms)]`` for each recorded latency."""
+        rows = []
+        for name, samples in self.latencies.items():
+            values = sorted(samples)
+            rows.append((name, percentile(values, 0.5) * 1000, percentile(values, 0.99) * 1000))
+        return rows
+
+    # --- HUD ---
+    def draw_hud(self, surface, font):
+        """Blit the HUD in the top-left corner; return the rect it covered."""
+        self._hud_age += 1
+        if self._hud_surface is None or self._hud_age >= HUD_REFRESH:
+            self._hud_surface = self._render_hud(font)
+            self._hud_age = 0
+        return surface.blit(self._hud_surface, (4, 4))
+
+    def _render_hud(self, font):
+        rows = self.summary()
+        latencies = self.latency_summary()
+        line_h = font.get_linesize()
+        lines = len(rows) + 1 + (len(latencies) + 1 if latencies else 0) + len(self.status)
+        height = line_h * lines + HISTOGRAM_HEIGHT + 12
+        hud = pygame.Surface((HUD_WIDTH, height), pygame.SRCALPHA)
+        hud.fill((0, 0, 0, 170))
+        y = 4
+        for line in self.status.values():
+            hud.blit(font.render(line, True, (255, 220, 120)), (4, y))
+            y += line_h
+        hud.blit(font.render("phase        p50    p99 ms", True, (180, 180, 180)), (4, y))
+        for name, p50, p99 in rows:
+            y += line_h
+            text = f"{name[:10]:<10} {p50:6.2f} {p99:6.2f}"
+            hud.blit(font.render(text, True, (255, 255, 255)), (4, y))
+        if latencies:
+            y += line_h
+            hud.blit(font.render("input to    p50    p99 ms", True, (180, 180, 180)), (4, y))
+            for name, p50, p99 in latencies:
+                y += line_h
+                text = f"{name[:10]:<10} {p50:6.2f} {p99:6.2f}"
+                hud.blit(font.render(text, True, (255, 255, 255)), (4, y))
+
+        # Frame-time histogram, one bar per millisecond
+        counts = [0] * HISTOGRAM_MS
+        for t in self.frame_times:
+            counts[min(int(t * 1000), HISTOGRAM_MS - 1)] += 1
+        peak = max(counts) or 1
+        base = height - 6
+        bar_w = (HUD_WIDTH - 8) // HISTOGRAM_MS
+        for i, count in enumerate(counts):
+            bar_h = count * HISTOGRAM_HEIGHT // peak
+            color = (80, 220, 80) if i < self.budget * 1000 else (240, 80, 80)  # within / over the frame budget
+            pygame.draw.rect(hud, color, (4 + i * bar_w, base - bar_h, bar_w - 1, bar_h))
+        return hud
+
+    # --- Export ---
+    def export(self, path):
+        """Write the trace as CSV if ``path`` ends in .csv, Chrome trace JSON otherwise."""
+        frames = list(self.trace or ())
+        origin = frames[0][0] if frames else 0.0
+        if path.endswith(".csv"):
+            with open(path, "w", newline="") as f:
+                writer = csv.writer(f)
+                writer.writerow(["frame", "phase", "start_ms", "duration_ms"])
+                for index, (start, end, laps) in enumerate(frames):
+                    writer.writerow([index, "frame", f"{(start - origin) * 1000:.3f}", f"{(end - start) * 1000:.3f}"])
+                    for phase, lap_start, lap_end in laps:
+                        writer.writerow([index, phase, f"{(lap_start - origin) * 1000:.3f}",
+                                         f"{(lap_end - lap_start) * 1000:.3f}"])
+            return
+        events = []
+        for index, (start, end, laps) in enumerate(frames):
+            events.append({"name": "frame", "ph": "X", "pid": 0, "tid": 0, "args": {"frame": index},
+                           "ts": (start - origin) * 1e6, "dur": (end - start) * 1e6})
+            for phase, lap_start, lap_end in laps:
+                events.append({"name": phase, "ph": "X", "pid": 0, "tid": 0,
+                               "ts": (lap_start - origin) * 1e6, "dur": (lap_end - lap_start) * 1e6})
+        with open(path, "w") as f:
+            json.dump({"traceEvents": events, "displayTimeUnit": "ms"}, f)
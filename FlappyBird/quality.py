@@ -0,0 +1,95 @@
+"""Adaptive quality: give up looks before giving up frame rate.
+
+``QUALITY_LEVELS`` runs from the full game to the cheapest one that still
+plays the same. ``QualityGovernor`` is told how long each frame kept the
+CPU busy (everything but the wait for the next frame) and moves one level
+at a time: down as soon as the slow frames of the last second eat most of
+the budget, up again only after several seconds with plenty to spare. A
+level that had to be left because it was too slow has to show headroom
+for twice as long before it is tried again, so a machine that only just
+cannot manage a level does not keep flickering in and out of it.
+
+Not every level saves something everywhere: the resolution levels only
+shrink a picture the window has room to enlarge. The game tells the
+governor which levels to ``skip`` in the current display mode, and it moves
+past those as if they were not there.
+"""
+from stats import percentile
+
+# Each level also keeps every saving of the levels before it.
+QUALITY_LEVELS = (
+    # output_scale shrinks the picture in a window larger than the game,
+    # which is where presenting the frame costs most; in a window the size
+    # of the game it changes nothing
+    {"name": "full", "effects": True, "scroll_background": True, "output_scale": 1.0},
+    # No button hover animation, no dimming overlay on the game over screen
+    {"name": "no effects", "effects": False, "scroll_background": True, "output_scale": 1.0},
+    # A background that stands still only needs presenting where sprites move
+    {"name": "static background", "effects": False, "scroll_background": False, "output_scale": 1.0},
+    {"name": "reduced resolution", "effects": False, "scroll_background": False, "output_scale": 0.75},
+    {"name": "low resolution", "effects": False, "scroll_background": False, "output_scale": 0.5},
+)
+
+WINDOW = 60  # frames per decision
+DOWNGRADE_AT = 0.85  # p90 busy time, as a share of the frame budget, that steps down
+UPGRADE_AT = 0.5  # p90 below this share steps up...
+UPGRADE_WINDOWS = 3  # ...once it has held for this many windows in a row
+MAX_BACKOFF = 5  # cap on how often the wait for a failed level doubles
+
+
+class QualityGovernor:
+    def __init__(self, budget, level=0, levels=QUALITY_LEVELS):
+        self.budget = budget  # seconds per frame
+        self.level = level
+        self.levels = levels
+        self.samples = []
+        self.calm_windows = 0  # windows in a row with room to step up
+        self.failures = [0] * len(levels)  # times each level was left for being too slow
+        self.skipped = frozenset()  # levels that would change nothing, never moved into
+
+    def skip(self, levels):
+        """Stop using ``levels``; return True if the current level was one of them.
+
+        From a skipped level the governor goes to the nearest better level
+        that is not skipped, which is the one it looks like anyway.
+        """
+        self.skipped = frozenset(levels)
+        if self.level not in self.skipped:
+            return False
+        self.level = self.next_level(-1)
+        self.calm_windows = 0
+        return True
+
+    def next_level(self, direction):
+        """The nearest level that is not skipped, cheaper (1) or better (-1) than this one, or None."""
+        level = self.level + direction
+        while 0 <= level < len(self.levels):
+            if level not in self.skipped:
+                return level
+            level += direction
+        return None
+
+    def frame(self, busy):
+        """Record one frame's busy time; return True if the level changed."""
+        samples = self.samples
+        samples.append(busy)
+        if len(samples) < WINDOW:
+            return False
+        p90 = percentile(sorted(samples), 0.9)
+        samples.clear()
+        cheaper = self.next_level(1)
+        if p90 > self.budget * DOWNGRADE_AT and cheaper is not None:
+            self.failures[self.level] = min(self.failures[self.level] + 1, MAX_BACKOFF)
+            self.level = cheaper
+            self.calm_windows = 0
+            return True
+        better = self.next_level(-1)
+        if p90 < self.budget * UPGRADE_AT and better is not None:
+            self.calm_windows += 1
+            if self.calm_windows >= UPGRADE_WINDOWS << self.failures[better]:
+                self.level = better
+                self.calm_windows = 0
+                return True
+        else:
+            self.calm_windows = 0
+        return False
@@ -0,0 +1,186 @@
+"""Compact binary replays of a run, and headless verification.
+
+A replay is everything ``simulation.World`` needs to play a run again: the
+seed, the difficulty settings and the frames on which the player flapped.
+It also stores the outcome (score and the frame the bird crashed on) so a
+replay can be checked by re-simulating it without a display:
+
+    python replay.py verify replays/*.fbr
+
+Layout, little-endian::
+
+    magic "FBRP", version u8, seed u64, gap i16, speed i16,
+    gravity f64, flap f64, score u32, death frame i32 (-1 if alive),
+    frames u32, flap count u32, then the flap frames as LEB128 varints,
+    each the distance from the previous flap.
+"""
+import argparse
+import struct
+import sys
+
+from collision import fast_forward
+from simulation import World
+
+MAGIC = b"FBRP"
+VERSION = 1
+HEADER = struct.Struct("<4sBQhhddIiII")
+
+
+def _write_varint(out, value):
+    while True:
+        byte = value & 0x7F
+        value >>= 7
+        if value:
+            out.append(byte | 0x80)
+        else:
+            out.append(byte)
+            return
+
+
+def _read_varint(data, pos):
+    value = shift = 0
+    while True:
+        if pos >= len(data):
+            raise ValueError("truncated replay")
+        byte = data[pos]
+        pos += 1
+        value |= (byte & 0x7F) << shift
+        if not byte & 0x80:
+            return value, pos
+        shift += 7
+
+
+class Replay:
+    """A seed, settings and flap frames, plus the outcome they produced."""
+
+    def __init__(self, seed, settings, flaps=(), score=0, death_frame=None, frames=0):
+        self.seed = seed
+        self.settings = {k: settings[k] for k in ("gap", "speed", "gravity", "flap")}
+        self.flaps = list(flaps)
+        self.score = score
+        self.death_frame = death_frame
+        self.frames = frames
+
+    def to_bytes(self):
+        s = self.settings
+        out = bytearray(HEADER.pack(
+            MAGIC, VERSION, self.seed, s["gap"], s["speed"], s["gravity"], s["flap"],
+            self.score, -1 if self.death_frame is None else self.death_frame,
+            self.frames, len(self.flaps)))
+        previous = 0
+        for frame in self.flaps:
+            _write_varint(out, frame - previous)
+            previous = frame
+        return bytes(out)
+
+    @classmethod
+    def from_bytes(cls, data):
+        (magic, version, seed, gap, speed, gravity, flap,
+         score, death_frame, frames, count) = HEADER.unpack_from(data)
+        if magic != MAGIC:
+            raise ValueError("not a Flappy Bird replay")
+        if version != VERSION:
+            raise ValueError(f"unsupported replay version {version}")
+        flaps = []
+        pos = HEADER.size
+        frame = 0
+        for _ in range(count):
+            delta, pos = _read_varint(data, pos)
+            frame += delta
+            flaps.append(frame)
+        if pos != len(data):
+            raise ValueError(f"{len(data) - pos} bytes after the last of {count} flaps")
+        settings = {"gap": gap, "speed": speed, "gravity": gravity, "flap": flap}
+        return cls(seed, settings, flaps, score,
+                   None if death_frame < 0 else death_frame, frames)
+
+    def save(self, path):
+        with open(path, "wb") as f:
+            f.write(self.to_bytes())
+
+    @classmethod
+    def load(cls, path):
+        with open(path, "rb") as f:
+            return cls.from_bytes(f.read())
+
+
+class Recorder:
+    """Captures a run as it is played.
+
+    Call ``record(action)`` with the flap input right before every
+    ``world.step(action)``, and ``finish()`` once the run is over.
+    """
+
+    def __init__(self, world):
+        self.world = world
+        self.replay = Replay(world.seed, world.settings)
+
+    def record(self, action):
+        if action:
+            self.replay.flaps.append(self.world.frame)
+
+    def finish(self):
+        world = self.world
+        replay = self.replay
+        replay.score = world.score
+        replay.frames = world.frame
+        replay.death_frame = world.crash_frame
+        return replay
+
+
+def play(replay, max_frames=None):
+    """Re-simulate a replay headlessly; return ``(score, death_frame)``."""
+    world = World(replay.settings, replay.seed)
+    limit = replay.frames if max_frames is None else max_frames
+    done = False
+    for flap in replay.flaps:
+        if flap < world.frame or flap >= limit:
+            break  # Out of order or past the end: stepping would never reach it either
+        if flap > world.frame:
+            done = fast_forward(world, flap - world.frame)[2]
+            if done:
+                break
+        done = world.step(True)[2]
+        if done:
+            break
+    if not done and world.frame < limit:
+        fast_forward(world, limit - world.frame)
+    return world.score, world.crash_frame
+
+
+def verify(replay):
+    """True if re-simulating the replay gives the recorded score and crash frame."""
+    return play(replay) == (replay.score, replay.death_frame)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Inspect and verify Flappy Bird replays.")
+    sub = parser.add_subparsers(dest="command", required=True)
+    sub.add_parser("verify", help="re-simulate replays and check their outcome").add_argument("paths", nargs="+")
+    sub.add_parser("info", help="print what a replay contains").add_argument("paths", nargs="+")
+    args = parser.parse_args(argv)
+
+    failures = 0
+    for path in args.paths:
+        try:
+            replay = Replay.load(path)
+        except (OSError, ValueError, struct.error) as e:
+            print(f"{path}: unreadable ({e})")
+            failures += 1
+            continue
+        if args.command == "info":
+            print(f"{path}: seed={replay.seed} settings={replay.settings} score={replay.score} "
+                  f"death_frame={replay.death_frame} frames={replay.frames} flaps={len(replay.flaps)}")
+            continue
+        score, death_frame = play(replay)
+        if (score, death_frame) == (replay.score, replay.death_frame):
+            print(f"{path}: OK (score {score})")
+        else:
+            failures += 1
+            print(f"{path}: MISMATCH recorded score {replay.score} at frame {replay.death_frame}, "
+                  f"replayed score {score} at frame {death_frame}")
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
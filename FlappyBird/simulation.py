@@ -0,0 +1,324 @@
+"""Display-free Flappy Bird rules.
+
+Everything that decides how a run plays out lives here: bird physics, pipe
+spawning, collisions and scoring. Nothing in this module touches pygame, so
+it can be imported without a display or mixer and stepped as fast as Python
+allows. The interactive game in ``flappy.py`` drives the same ``World`` class,
+which keeps bots, soak tests and real players on identical trajectories.
+"""
+import random
+import struct
+from collections import deque
+
+# --- Global Constants ---
+BASE_WIDTH = 400
+BASE_HEIGHT = 600
+GROUND_HEIGHT = 50
+PIPE_WIDTH = 70
+PIPE_INSET = 4  # the pipe body is this much narrower than its cap on each side
+BIRD_START_X = 50
+BIRD_SIZE = (50, 50)  # flappy.png scaled to 50px wide
+FPS = 60
+
+MAX_FALL_SPEED = 15
+FLOOR_Y = BASE_HEIGHT - GROUND_HEIGHT - 10
+FIRST_PIPE_X = BASE_WIDTH + 100
+PIPE_SPAWN_X = BASE_WIDTH
+PIPE_SPACING = 200  # spawn once the newest pipe is this far left of the edge
+PIPE_MIN_HEIGHT = 80
+PIPE_DESPAWN_X = -100
+# At most one pipe spawns every PIPE_SPACING px and each lives for
+# FIRST_PIPE_X - PIPE_DESPAWN_X px, so a handful of slots is always enough.
+MAX_PIPES = (FIRST_PIPE_X - PIPE_DESPAWN_X) // PIPE_SPACING + 2
+
+# --- Difficulty Defaults ---
+DIFFICULTY = {
+    "EASY": {"gap": 200, "speed": 3, "gravity": 0.4, "flap": -7},
+    "MEDIUM": {"gap": 170, "speed": 4, "gravity": 0.45, "flap": -7.5},
+    "HARD": {"gap": 140, "speed": 5, "gravity": 0.55, "flap": -8.5},
+    "CUSTOM": {"gap": 170, "speed": 4, "gravity": 0.45, "flap": -7.5} # Default custom
+}
+
+HITBOX_SHRINK_X = 32
+HITBOX_SHRINK_Y = 20
+
+STATES = ("PLAYING", "FALLING", "GAMEOVER")
+# seed, gap, speed, gravity, flap, frame, score, state, crash frame (-1 if none),
+# pipes spawned, bird y, velocity, angle, centre y, live pipe count
+SNAPSHOT_HEADER = struct.Struct("<QhhddIIBiIdddiB")
+SNAPSHOT_PIPE = struct.Struct("<d?")  # x, passed
+
+
+class BirdBody:
+    """Bird physics without an image attached."""
+    __slots__ = ("x", "y", "velocity", "angle", "gravity", "flap_strength",
+                 "width", "height", "center_y")
+
+    def __init__(self, settings, size=BIRD_SIZE):
+        self.x = BIRD_START_X
+        self.y = BASE_HEIGHT // 2
+        self.velocity = 0
+        self.angle = 0
+        self.gravity = settings["gravity"]
+        self.flap_strength = settings["flap"]
+        self.width, self.height = size
+        self.center_y = int(self.y)
+
+    def flap(self):
+        self.velocity = self.flap_strength
+
+    def update(self):
+        self.velocity += self.gravity
+        if self.velocity > MAX_FALL_SPEED: self.velocity = MAX_FALL_SPEED
+        self.y += self.velocity
+
+        if self.velocity < 0: self.angle = 20
+        else:
+            if self.angle > -90: self.angle -= 3
+        self.center_y = int(self.y)
+
+    def update_falling(self):
+        self.velocity += self.gravity
+        if self.velocity > MAX_FALL_SPEED: self.velocity = MAX_FALL_SPEED
+        self.y += self.velocity
+        self.angle -= 5
+        if self.angle < -90: self.angle = -90
+        self.center_y = int(self.y)
+
+    def hitbox(self):
+        """Return the shrunken collision box as ``(left, top, right, bottom)``.
+
+        Matches ``Rect(center=...).inflate(-HITBOX_SHRINK_X, -HITBOX_SHRINK_Y)``
+        on the sprite rect, using the integer centre from the last update.
+        """
+        left = self.x - self.width // 2 + HITBOX_SHRINK_X // 2
+        top = self.center_y - self.height // 2 + HITBOX_SHRINK_Y // 2
+        return (left, top,
+                left + self.width - HITBOX_SHRINK_X,
+                top + self.height - HITBOX_SHRINK_Y)
+
+
+class PipeBody:
+    """A pipe pair: ``height`` is the bottom edge of the top pipe."""
+    __slots__ = ("x", "width", "gap", "speed", "height", "passed")
+
+    def __init__(self, x, settings, height):
+        self.width = PIPE_WIDTH
+        self.gap = settings["gap"]
+        self.speed = settings["speed"]
+        self.place(x, height)
+
+    def place(self, x, height):
+        """Start over as a fresh pipe at ``x``, so pipe objects can be reused."""
+        self.x = x
+        self.height = height
+        self.passed = False
+
+    def update(self):
+        self.x -= self.speed
+
+    def collides(self, left, top, right, bottom):
+        """Test a hitbox against both pipe bodies (caps overhang harmlessly)."""
+        body_left = self.x + PIPE_INSET
+        body_right = self.x + self.width - PIPE_INSET
+        if left >= body_right or right <= body_left:
+            return False
+        if top < self.height and bottom > 0:
+            return True
+        bottom_top = self.height + self.gap
+        return top < bottom_top + BASE_HEIGHT and bottom > bottom_top
+
+
+class World:
+    """One run of the game, advanced a frame at a time with ``step``.
+
+    ``state`` follows the interactive game: ``PLAYING`` until the bird hits a
+    pipe (``FALLING``) or the ground (``GAMEOVER``). Sounds the frame should
+    trigger are left in ``events`` for the caller to play.
+    """
+
+    bird_class = BirdBody
+    pipe_class = PipeBody
+
+    def __init__(self, settings, seed=None, bird_size=BIRD_SIZE):
+        self.settings = settings
+        self.bird_size = bird_size
+        self.pipes = deque()  # oldest first; scrolled-off pipes leave from the left
+        self.spare_pipes = []  # scrolled-off pipes, reused by spawn
+        self.reset(seed)
+
+    def reset(self, seed=None):
+        """Start a fresh run; the same seed always yields the same pipes.
+
+        Without a seed one is drawn at random, and kept in ``self.seed`` so
+        the run can still be replayed.
+        """
+        if seed is None:
+            seed = random.getrandbits(63)
+        self.seed = seed
+        self.rng = random.Random(seed)
+        self.heights = []
+        self.spawned = 0
+        self.bird = self.bird_class(self.settings, self.bird_size)
+        self.spare_pipes += self.pipes
+        self.pipes.clear()
+        self.spawn(FIRST_PIPE_X)
+        self.score = 0
+        self.state = "PLAYING"
+        self.frame = 0
+        self.crash_frame = None
+        self.events = []
+        return self.observe()
+
+    def pipe_height(self, index):
+        """Height of the ``index``-th pipe of the run, drawn from the seed on first use.
+
+        Heights are remembered, so a run rewound with ``restore`` meets the
+        same pipes again.
+        """
+        heights = self.heights
+        if index >= len(heights):
+            max_height = BASE_HEIGHT - GROUND_HEIGHT - self.settings["gap"] - 50
+            rng = self.rng
+            while index >= len(heights):
+                heights.append(rng.randint(PIPE_MIN_HEIGHT, max_height))
+        return heights[index]
+
+    def spawn(self, x):
+        """Add the next pipe at ``x``, recycling a scrolled-off one if there is one."""
+        height = self.pipe_height(self.spawned)
+        self.spawned += 1
+        spare = self.spare_pipes
+        if spare:
+            pipe = spare.pop()
+            pipe.place(x, height)
+        else:
+            pipe = self.pipe_class(x, self.settings, height)
+        self.pipes.append(pipe)
+        return pipe
+
+    def observe(self):
+        """Return ``(bird_y, velocity, pipe_dx, pipe_height, pipe_gap)``.
+
+        The pipe is the nearest one whose body has not yet cleared the
+        bird's hitbox.
+        """
+        bird = self.bird
+        left = bird.hitbox()[0]
+        for pipe in self.pipes:
+            if pipe.x + pipe.width - PIPE_INSET > left:
+                return (bird.y, bird.velocity, pipe.x - bird.x, pipe.height, pipe.gap)
+        return (bird.y, bird.velocity, 0, 0, 0)
+
+    def step(self, action=False):
+        """Advance one frame, flapping first if ``action`` is truthy.
+
+        Returns ``(observation, reward, done)`` where ``reward`` is the number
+        of pipes passed this frame and ``done`` means the bird has crashed.
+        """
+        events = self.events
+        events.clear()
+        state = self.state
+        if state == "GAMEOVER":
+            return self.observe(), 0, True
+
+        bird = self.bird
+        if state == "FALLING":
+            bird.update_falling()
+            if bird.y >= FLOOR_Y:
+                self.state = "GAMEOVER"
+            self.frame += 1
+            return self.observe(), 0, True
+
+        if action:
+            bird.flap()
+            events.append("flap")
+        bird.update()
+
+        pipes = self.pipes
+        if pipes[-1].x < PIPE_SPAWN_X - PIPE_SPACING:
+            self.spawn(PIPE_SPAWN_X)
+
+        left, top, right, bottom = bird.hitbox()
+        reward = 0
+        for pipe in pipes:
+            pipe.update()
+            if pipe.collides(left, top, right, bottom):
+                state = "FALLING"
+                events.append("hit")
+            if not pipe.passed and pipe.x < bird.x:
+                reward += 1
+                pipe.passed = True
+                events.append("point")
+
+        if bird.y >= FLOOR_Y:
+            state = "GAMEOVER"
+            events.append("hit")
+
+        if bird.y < 0: bird.y = 0
+        if pipes[0].x < PIPE_DESPAWN_X: self.spare_pipes.append(pipes.popleft())
+
+        self.score += reward
+        self.state = state
+        if state != "PLAYING":
+            self.crash_frame = self.frame
+        self.frame += 1
+        return self.observe(), reward, state != "PLAYING"
+
+    # --- Snapshots ---
+    def snapshot(self):
+        """Capture the run in a small tuple that ``restore`` rolls back to.
+
+        Pipe heights are not copied: they follow from the seed and the
+        number of pipes spawned so far.
+        """
+        bird = self.bird
+        pipes = []
+        for pipe in self.pipes:
+            pipes += (pipe.x, pipe.passed)
+        return (self.frame, self.score, self.state, self.crash_frame, self.spawned,
+                bird.y, bird.velocity, bird.angle, bird.center_y, tuple(pipes))
+
+    def restore(self, snapshot):
+        """Put the run back where ``snapshot`` was taken."""
+        (self.frame, self.score, self.state, self.crash_frame, self.spawned,
+         y, velocity, angle, center_y, pipes) = snapshot
+        bird = self.bird
+        bird.y = y
+        bird.velocity = velocity
+        bird.angle = angle
+        bird.center_y = center_y
+        spawned = self.spawned
+        self.spawned -= len(pipes) // 2
+        self.spare_pipes += self.pipes
+        self.pipes.clear()
+        for i in range(0, len(pipes), 2):
+            self.spawn(pipes[i]).passed = pipes[i + 1]
+        self.spawned = spawned
+        self.events.clear()
+
+    def to_bytes(self):
+        """Serialise the current state, with the seed and settings needed to rebuild it."""
+        (frame, score, state, crash_frame, spawned,
+         y, velocity, angle, center_y, pipes) = self.snapshot()
+        s = self.settings
+        out = bytearray(SNAPSHOT_HEADER.pack(
+            self.seed, s["gap"], s["speed"], s["gravity"], s["flap"], frame, score,
+            STATES.index(state), -1 if crash_frame is None else crash_frame, spawned,
+            y, velocity, angle, center_y, len(pipes) // 2))
+        for i in range(0, len(pipes), 2):
+            out += SNAPSHOT_PIPE.pack(pipes[i], pipes[i + 1])
+        return bytes(out)
+
+    @classmethod
+    def from_bytes(cls, data):
+        """Rebuild a world saved with ``to_bytes``."""
+        (seed, gap, speed, gravity, flap, frame, score, state, crash_frame, spawned,
+         y, velocity, angle, center_y, count) = SNAPSHOT_HEADER.unpack_from(data)
+        world = cls({"gap": gap, "speed": speed, "gravity": gravity, "flap": flap}, seed)
+        pipes = []
+        for i in range(count):
+            pipes += SNAPSHOT_PIPE.unpack_from(data, SNAPSHOT_HEADER.size + i * SNAPSHOT_PIPE.size)
+        world.restore((frame, score, STATES[state], None if crash_frame < 0 else crash_frame,
+                       spawned, y, velocity, angle, center_y, tuple(pipes)))
+        return world
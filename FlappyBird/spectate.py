@@ -0,0 +1,361 @@
+"""Streaming a live game to spectators as world snapshots instead of video.
+
+The host publishes its state once per frame through ``SpectatorServer``,
+which serves any number of viewers over TCP from an asyncio loop in a
+background thread. A spectator rebuilds the run from the snapshots and
+draws it with the game's own sprites:
+
+    python flappy.py --serve 5555
+    python spectate.py 127.0.0.1:5555
+
+Every message is a kind byte and a u16 payload length, then the payload:
+
+* keyframe: the host's game state as a u8 index into ``GAME_STATES``,
+  followed by ``World.to_bytes()`` while there is a run to show.
+* delta: a u32 mask of the snapshot fields that changed since the previous
+  frame, then those fields packed in order (``FIELD_FORMATS``, then
+  ``PIPE_FORMATS`` per pipe). Pipe heights are never sent; they follow
+  from the seed in the last keyframe.
+
+A delta is only published when it applies to the previous frame: same
+state, same run and the same number of pipes. Otherwise the frame goes out
+as a keyframe.
+
+Each frame is encoded once and the same bytes are written to every viewer,
+so a viewer costs one socket write per frame. A viewer whose connection
+cannot keep up is skipped while its send buffer is full and gets a keyframe
+of the latest state as soon as it drains: slow viewers see fewer frames,
+and the game never waits for them.
+"""
+import argparse
+import asyncio
+import socket
+import struct
+import sys
+import threading
+import time
+
+from simulation import MAX_PIPES, STATES, World
+
+DEFAULT_PORT = 5555
+GAME_STATES = ("MENU", "CUSTOM_MENU", "PLAYING", "FALLING", "GAMEOVER")
+WORLD_STATES = ("PLAYING", "FALLING", "GAMEOVER")  # states in which the run is on screen
+KEYFRAME = 0
+DELTA = 1
+MESSAGE = struct.Struct("<BH")  # kind, payload length
+DELTA_MASK = struct.Struct("<I")
+# frame, score, state, crash frame (-1 if none), pipes spawned, bird y,
+# velocity, angle, centre y; as in World.snapshot()
+FIELD_FORMATS = "IIBiIdddi"
+PIPE_FORMATS = "d?"  # x, passed
+assert len(FIELD_FORMATS) + len(PIPE_FORMATS) * MAX_PIPES <= DELTA_MASK.size * 8
+VIEWER_SEND_BUFFER = 16 * 1024  # kernel send buffer per viewer
+VIEWER_WRITE_LIMIT = 2 * 1024  # bytes queued for a viewer before it is skipped
+RECONNECT_INTERVAL = 1.0  # seconds between a spectator's attempts to connect
+
+
+def parse_address(text, default_host="127.0.0.1"):
+    """``"HOST:PORT"`` or ``"PORT"`` as ``(host, port)``."""
+    host, _, port = text.rpartition(":")
+    return host or default_host, int(port)
+
+
+def _flatten(snapshot):
+    """``World.snapshot()`` as one flat list of fields, in FIELD_FORMATS order."""
+    frame, score, state, crash_frame, spawned, y, velocity, angle, center_y, pipes = snapshot
+    fields = [frame, score, STATES.index(state), -1 if crash_frame is None else crash_frame,
+              spawned, y, velocity, angle, center_y]
+    fields += pipes
+    return fields
+
+
+def _unflatten(fields):
+    frame, score, state, crash_frame, spawned, y, velocity, angle, center_y = fields[:9]
+    return (frame, score, STATES[state], None if crash_frame < 0 else crash_frame, spawned,
+            y, velocity, angle, center_y, tuple(fields[9:]))
+
+
+def _formats(count):
+    return FIELD_FORMATS + PIPE_FORMATS * ((count - len(FIELD_FORMATS)) // len(PIPE_FORMATS))
+
+
+class SnapshotEncoder:
+    """Turns the host's state into a keyframe, and a delta when one applies."""
+
+    def __init__(self):
+        self.state = None
+        self.world = None
+        self.fields = None
+
+    def encode(self, state, world):
+        """Return ``(keyframe, delta)`` messages for this frame; ``delta`` may be None."""
+        if state not in WORLD_STATES:
+            world = None
+        payload = bytes((GAME_STATES.index(state),))
+        fields = None
+        if world is not None:
+            payload += world.to_bytes()
+            fields = _flatten(world.snapshot())
+        keyframe = MESSAGE.pack(KEYFRAME, len(payload)) + payload
+
+        delta = None
+        previous = self.fields
+        if state == self.state and world is self.world and (
+                fields is None or len(fields) == len(previous)):
+            mask = 0
+            changed = []
+            formats = ["<I"]
+            for i, (old, new, fmt) in enumerate(zip(previous or (), fields or (), _formats(len(fields or ())))):
+                if old != new:
+                    mask |= 1 << i
+                    changed.append(new)
+                    formats.append(fmt)
+            payload = struct.pack("".join(formats), mask, *changed)
+            delta = MESSAGE.pack(DELTA, len(payload)) + payload
+
+        self.state = state
+        self.world = world
+        self.fields = fields
+        return keyframe, delta
+
+
+class SnapshotDecoder:
+    """Rebuilds the host's state from its messages.
+
+    ``world`` is an instance of ``world_class`` that follows the host's
+    run, or None while the host has no run on screen.
+    """
+
+    def __init__(self, world_class=World):
+        self.world_class = world_class
+        self.buffer = bytearray()
+        self.state = None
+        self.world = None
+        self.fields = None
+
+    def feed(self, data):
+        """Apply every complete message in what has arrived so far; return how many there were."""
+        buffer = self.buffer
+        buffer += data
+        pos = 0
+        count = 0
+        while len(buffer) - pos >= MESSAGE.size:
+            kind, length = MESSAGE.unpack_from(buffer, pos)
+            start = pos + MESSAGE.size
+            if len(buffer) < start + length:
+                break
+            payload = bytes(buffer[start:start + length])
+            if kind == KEYFRAME:
+                self._keyframe(payload)
+            elif kind == DELTA:
+                self._delta(payload)
+            else:
+                raise ValueError(f"unknown message kind {kind}")
+            pos = start + length
+            count += 1
+        del buffer[:pos]
+        return count
+
+    def _keyframe(self, payload):
+        self.state = GAME_STATES[payload[0]]
+        if len(payload) > 1:
+            self.world = self.world_class.from_bytes(payload[1:])
+            self.fields = _flatten(self.world.snapshot())
+        else:
+            self.world = self.fields = None
+
+    def _delta(self, payload):
+        (mask,) = DELTA_MASK.unpack_from(payload)
+        if not mask:
+            return
+        fields = self.fields
+        changed = [i for i in range(len(fields)) if mask >> i & 1]
+        formats = _formats(len(fields))
+        values = struct.unpack_from("<" + "".join(formats[i] for i in changed), payload, DELTA_MASK.size)
+        for i, value in zip(changed, values):
+            fields[i] = value
+        self.world.restore(_unflatten(fields))
+
+
+# --- SERVER ---
+class _Viewer(asyncio.Protocol):
+    def __init__(self, server):
+        self.server = server
+        self.transport = None
+        self.paused = False
+        self.behind = True  # missed a frame, so the next one must be a keyframe
+
+    def connection_made(self, transport):
+        self.transport = transport
+        # Keep little in flight, so a slow viewer is skipped rather than shown old frames
+        transport.get_extra_info("socket").setsockopt(socket.SOL_SOCKET, socket.SO_SNDBUF, VIEWER_SEND_BUFFER)
+        transport.set_write_buffer_limits(high=VIEWER_WRITE_LIMIT)
+        self.server.viewers.add(self)
+        if self.server.keyframe:
+            self.send(self.server.keyframe, None)
+
+    def connection_lost(self, exc):
+        self.server.viewers.discard(self)
+
+    def pause_writing(self):
+        self.paused = True
+
+    def resume_writing(self):
+        self.paused = False
+        if self.behind and self.server.keyframe:
+            self.send(self.server.keyframe, None)
+
+    def send(self, keyframe, delta):
+        if self.paused:
+            self.behind = True
+        elif self.behind or delta is None:
+            self.transport.write(keyframe)
+            self.behind = False
+        else:
+            self.transport.write(delta)
+
+
+class SpectatorServer:
+    """Serves the host's frames to spectators from a background thread."""
+
+    def __init__(self, host="127.0.0.1", port=DEFAULT_PORT):
+        self.encoder = SnapshotEncoder()
+        self.viewers = set()
+        self.keyframe = None  # the latest frame, for viewers that join or catch up
+        self.loop = asyncio.new_event_loop()
+        self.server = self.loop.run_until_complete(
+            self.loop.create_server(lambda: _Viewer(self), host, port))
+        self.address = self.server.sockets[0].getsockname()[:2]
+        self.thread = threading.Thread(target=self.loop.run_forever, name="spectator-server", daemon=True)
+        self.thread.start()
+
+    def publish(self, state, world):
+        """Send the game's current ``state`` and ``world`` to every viewer; never blocks."""
+        keyframe, delta = self.encoder.encode(state, world)
+        self.loop.call_soon_threadsafe(self._broadcast, keyframe, delta)
+
+    def _broadcast(self, keyframe, delta):
+        self.keyframe = keyframe
+        for viewer in self.viewers:
+            viewer.send(keyframe, delta)
+
+    async def _shutdown(self):
+        self.server.close()
+        for viewer in list(self.viewers):
+            viewer.transport.close()
+        await self.server.wait_closed()
+
+    def close(self):
+        asyncio.run_coroutine_threadsafe(self._shutdown(), self.loop).result()
+        self.loop.call_soon_threadsafe(self.loop.stop)
+        self.thread.join()
+        self.loop.close()
+
+
+# --- SPECTATOR ---
+def draw(flappy, decoder, background, ground, status):
+    """Draw the host's frame into game_surface with the game's own sprites."""
+    surface = flappy.game_surface
+    background.draw()
+    world = decoder.world
+    if world is not None:
+        for pipe in world.pipes:
+            pipe.draw()
+        world.bird.draw()
+    ground.draw()
+
+    white = (255, 255, 255)
+    if decoder.state == "PLAYING":
+        s_surf = flappy.text_sprites.get((flappy.score_font, str(world.score), white))
+        surface.blit(s_surf, (flappy.BASE_WIDTH//2 - 10, 50))
+    elif decoder.state == "GAMEOVER":
+        over_surf = flappy.text_sprites.get((flappy.title_font, "GAME OVER", (255, 80, 80)))
+        surface.blit(over_surf, over_surf.get_rect(center=(flappy.BASE_WIDTH//2, 150)))
+        score_surf = flappy.text_sprites.get((flappy.score_font, f"Score: {world.score}", white))
+        surface.blit(score_surf, score_surf.get_rect(center=(flappy.BASE_WIDTH//2, 220)))
+    if status:
+        t_surf = flappy.text_sprites.get((flappy.ui_font, status, white))
+        surface.blit(t_surf, t_surf.get_rect(center=(flappy.BASE_WIDTH//2, flappy.BASE_HEIGHT//2)))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Watch a Flappy Bird game served with flappy.py --serve.")
+    parser.add_argument("address", nargs="?", default=str(DEFAULT_PORT),
+                        help=f"host to watch, as HOST:PORT or PORT (default 127.0.0.1:{DEFAULT_PORT})")
+    parser.add_argument("--backend", choices=("surface", "texture"), default="surface",
+                        help="renderer backend, as in flappy.py")
+    args = parser.parse_args(argv)
+    address = parse_address(args.address)
+
+    import pygame
+    import flappy  # Imported here: flappy imports this module for the server
+
+    flappy.init(args.backend)
+    pygame.display.set_caption("Flappy Bird: Spectating")
+    background = flappy.BackgroundManager(city=flappy.asset_cache.load_surface(flappy.CITY_CACHE, flappy.city_key()))
+    ground = flappy.Ground()
+    decoder = SnapshotDecoder(flappy.GameWorld)  # replaced on every connection
+    sock = None
+    next_attempt = 0.0
+
+    running = True
+    while running:
+        flappy.clock.tick(flappy.FPS)
+        for event in pygame.event.get():
+            if event.type == pygame.QUIT:
+                running = False
+            elif event.type == pygame.KEYDOWN:
+                if event.key == pygame.K_F11 or (event.key == pygame.K_ESCAPE and flappy.is_fullscreen):
+                    flappy.toggle_fullscreen()
+
+        if sock is None and time.monotonic() >= next_attempt:
+            try:
+                sock = socket.create_connection(address, timeout=RECONNECT_INTERVAL)
+                sock.setblocking(False)
+                decoder = SnapshotDecoder(flappy.GameWorld)
+            except OSError:
+                next_attempt = time.monotonic() + RECONNECT_INTERVAL
+
+        frames = 0
+        while sock is not None:
+            try:
+                data = sock.recv(65536)
+            except BlockingIOError:
+                break
+            except OSError:
+                data = b""
+            if not data:  # The host has gone; keep showing the last frame and retry
+                sock.close()
+                sock = None
+                next_attempt = time.monotonic() + RECONNECT_INTERVAL
+                break
+            frames += decoder.feed(data)
+
+        # Scroll the scenery by the frames that went by on the host
+        state = decoder.state
+        for _ in range(frames):
+            if state == "PLAYING":
+                background.update()
+                ground.update(speed_override=decoder.world.settings["speed"])
+            elif state in ("MENU", "CUSTOM_MENU"):
+                background.update()
+                ground.update(speed_override=2)
+
+        if sock is None:
+            status = f"Connecting to {address[0]}:{address[1]}..."
+        elif state is None or state in ("MENU", "CUSTOM_MENU"):
+            status = "Waiting for the next run"
+        else:
+            status = None
+        draw(flappy, decoder, background, ground, status)
+        flappy.presenter.mark_all_dirty()
+        flappy.presenter.present()
+
+    if sock is not None:
+        sock.close()
+    pygame.quit()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,11 @@
+"""Summary figures shared by the game, the benchmark and the headless tools.
+
+Nothing here imports pygame, so the display-free modules can use it too.
+"""
+
+
+def percentile(sorted_values, p):
+    """The value a share ``p`` of the way up ``sorted_values``, or 0.0 if there are none."""
+    if not sorted_values:
+        return 0.0
+    return sorted_values[min(len(sorted_values) - 1, int(p * len(sorted_values)))]
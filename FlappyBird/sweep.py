@@ -0,0 +1,188 @@
+"""Headless difficulty sweep.
+
+Plays many seeded games per difficulty with a scripted policy, spread over a
+process pool, and reports score distributions and survival curves:
+
+    python sweep.py --seeds 0:5000 --speeds 3,6,9 --gaps 120,170 --out sweep.json
+
+Work is split into chunks of consecutive seeds. Each chunk's results are
+plain histograms that merge by addition, so the output only depends on the
+seed range and settings, never on the number of workers or chunk order.
+"""
+import argparse
+import itertools
+import json
+import multiprocessing
+import os
+import time
+from collections import Counter
+
+from simulation import DIFFICULTY, FPS, World
+
+try:
+    from batch import BatchWorld
+except ImportError:  # NumPy is optional; the scalar engine gives the same numbers
+    BatchWorld = None
+
+PRESETS = ("EASY", "MEDIUM", "HARD")
+POLICY_MARGIN = 30
+
+
+def scripted_policy(observation):
+    """Flap when the bird is falling into the lower lip of the next gap.
+
+    Works on the scalars from ``World.observe`` and, unchanged, on the
+    arrays from ``BatchWorld.observe``.
+    """
+    y, velocity, _, height, gap = observation
+    return (y + 15 > height + gap - POLICY_MARGIN) & (velocity >= 0)
+
+
+def play_scalar(settings, seeds, max_frames):
+    """Yield ``(score, death_frame)`` per seed; ``death_frame`` is None for survivors."""
+    for seed in seeds:
+        world = World(settings, seed)
+        observation = world.observe()
+        done = False
+        while not done and world.frame < max_frames:
+            observation, _, done = world.step(scripted_policy(observation))
+        yield world.score, (world.frame - 1 if done else None)
+
+
+def play_batch(settings, seeds, max_frames):
+    world = BatchWorld(settings, seeds)
+    while world.frame < max_frames and world.alive.any():
+        world.step(scripted_policy(world.observe()))
+    for score, death_frame in zip(world.score.tolist(), world.death_frame.tolist()):
+        yield score, (death_frame if death_frame >= 0 else None)
+
+
+def run_chunk(task):
+    """Worker entry point: play one chunk of seeds for one configuration."""
+    name, settings, start, stop, max_frames, engine = task
+    play = play_batch if engine == "batch" else play_scalar
+    scores = Counter()
+    deaths = Counter()
+    for score, death_frame in play(settings, range(start, stop), max_frames):
+        scores[score] += 1
+        if death_frame is not None:
+            deaths[death_frame] += 1
+    return name, scores, deaths
+
+
+def build_configs(args):
+    configs = {}
+    for name in PRESETS:
+        configs[name] = dict(DIFFICULTY[name])
+    custom = DIFFICULTY["CUSTOM"]
+    for speed, gap, gravity in itertools.product(args.speeds, args.gaps, args.gravities):
+        settings = {"gap": gap, "speed": speed, "gravity": gravity, "flap": custom["flap"]}
+        configs[f"speed={speed} gap={gap} gravity={gravity}"] = settings
+    return configs
+
+
+def summarize(settings, scores, deaths, games, max_frames, interval):
+    values = sorted(scores.elements())
+    def percentile(p):
+        return values[min(len(values) - 1, int(p * len(values)))]
+    alive = games
+    curve = []
+    death_iter = iter(sorted(deaths.items()))
+    pending = next(death_iter, None)
+    for frame in range(0, max_frames + 1, interval):
+        while pending is not None and pending[0] < frame:
+            alive -= pending[1]
+            pending = next(death_iter, None)
+        curve.append([frame, alive / games])
+    return {
+        "settings": settings,
+        "games": games,
+        "mean": sum(values) / games,
+        "p50": percentile(0.5),
+        "p90": percentile(0.9),
+        "max": values[-1],
+        "survivors": games - sum(deaths.values()),
+        "scores": {str(k): v for k, v in sorted(scores.items())},
+        "survival": curve,
+    }
+
+
+def parse_range(text):
+    start, _, stop = text.partition(":")
+    return int(start), int(stop)
+
+
+def parse_list(kind):
+    return lambda text: [kind(v) for v in text.split(",") if v]
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--seeds", type=parse_range, default=(0, 1000),
+                        help="half-open seed range START:STOP (default 0:1000)")
+    parser.add_argument("--speeds", type=parse_list(int), default=[],
+                        help="custom pipe speeds to sweep, e.g. 3,6,9")
+    parser.add_argument("--gaps", type=parse_list(int), default=[],
+                        help="custom pipe gaps to sweep, e.g. 120,170,220")
+    parser.add_argument("--gravities", type=parse_list(float), default=[],
+                        help="custom gravities to sweep, e.g. 0.35,0.45")
+    parser.add_argument("--max-frames", type=int, default=FPS * 300,
+                        help="stop a game after this many frames (default 5 minutes)")
+    parser.add_argument("--chunk", type=int, default=250, help="seeds per work unit")
+    parser.add_argument("--workers", type=int, default=os.cpu_count())
+    parser.add_argument("--engine", choices=("auto", "batch", "scalar"), default="auto")
+    parser.add_argument("--interval", type=int, default=FPS,
+                        help="survival curve resolution in frames")
+    parser.add_argument("--out", help="write the full results as JSON")
+    args = parser.parse_args(argv)
+
+    # An empty axis would zero the product; fall back to the custom default.
+    custom = DIFFICULTY["CUSTOM"]
+    if args.speeds or args.gaps or args.gravities:
+        args.speeds = args.speeds or [custom["speed"]]
+        args.gaps = args.gaps or [custom["gap"]]
+        args.gravities = args.gravities or [custom["gravity"]]
+
+    engine = args.engine
+    if engine == "auto":
+        engine = "batch" if BatchWorld is not None else "scalar"
+    elif engine == "batch" and BatchWorld is None:
+        parser.error("the batch engine needs NumPy")
+
+    start, stop = args.seeds
+    if stop <= start:
+        parser.error("--seeds needs STOP greater than START")
+
+    configs = build_configs(args)
+    tasks = [(name, settings, lo, min(lo + args.chunk, stop), args.max_frames, engine)
+             for name, settings in configs.items()
+             for lo in range(start, stop, args.chunk)]
+
+    scores = {name: Counter() for name in configs}
+    deaths = {name: Counter() for name in configs}
+    began = time.perf_counter()
+    with multiprocessing.Pool(args.workers) as pool:
+        for name, chunk_scores, chunk_deaths in pool.imap_unordered(run_chunk, tasks):
+            scores[name].update(chunk_scores)
+            deaths[name].update(chunk_deaths)
+    elapsed = time.perf_counter() - began
+
+    games = stop - start
+    results = {name: summarize(configs[name], scores[name], deaths[name],
+                               games, args.max_frames, args.interval)
+               for name in configs}
+
+    print(f"{games} games x {len(configs)} configs in {elapsed:.1f}s "
+          f"({args.workers} workers, {engine} engine)")
+    print(f"{'config':<36} {'mean':>7} {'p50':>5} {'p90':>5} {'max':>5} {'alive':>6}")
+    for name, r in results.items():
+        print(f"{name:<36} {r['mean']:>7.2f} {r['p50']:>5} {r['p90']:>5} {r['max']:>5} {r['survivors']:>6}")
+
+    if args.out:
+        with open(args.out, "w") as f:
+            json.dump({"seeds": [start, stop], "max_frames": args.max_frames,
+                       "engine": engine, "results": results}, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()